@@ -2,14 +2,36 @@
 import dash
 import flask
 import dash_core_components as dcc
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash_html_components as html
 import plotly.graph_objs as go
-from scipy.io import wavfile
 import numpy as np
 
-import base64
-import io
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from random import randint
+from urllib.parse import parse_qs
+
+from cache import LRUCache
+from dsp import spectr_layout, SpectrIndex, LODPyramid
+from dsp import iter_blocks, avg_filter_blocks, trap_filter_blocks
+from dsp import avg_filter_range, trap_filter_range, time2spectr
+from payload import time_traces, window_traces, window_spectr, spectr_trace
+from parallel import avg_filter_parallel, trap_filter_parallel
+from jobs import JobQueue
+from pulses import detect_pulses
+from psd import WelchIndex, PSD_SEGMENTS
+import live
+from metrics import METRICS
+from loaders import load_wav, wav_info, TEXT_SAMPLERATE
+from loaders import parse_content_type, parse_upload
+from store import SignalStore, DEFAULT_ROOT as DEFAULT_STORE_ROOT
+from uploads import ChunkedUploads
+from export import EXPORT_FORMATS, content_length, encode_blocks
 
 #==================================
 #   constant
@@ -17,8 +39,41 @@ import io
 AMPLITUDE = 2**15
 INIT_SPEC_BOUNDS = [18*10**3-AMPLITUDE, 48*10**3-AMPLITUDE]
 INIT_TIME_BOUNDS = [0, 2]
+TIME_GRAPHIC_POINTS = 2000
+
+INIT_PATH = os.environ.get('INIT_PATH', 'input/wave400.wav')
+# header only; the samples are mapped on first use (get_init_data)
+INIT_SMR, INIT_LENGTH, _ = wav_info(INIT_PATH)
+INIT_DURATION = int(INIT_LENGTH/float(INIT_SMR))
 
-INIT_SMR, INIT_DATA = wavfile.read('input/wave400.wav')
+INIT_SIGNAL_ID = 'init'
+SIGNAL_STORE_DIR = os.environ.get('SIGNAL_STORE_DIR', DEFAULT_STORE_ROOT)
+SIGNAL_STORE_BYTES = int(os.environ.get('SIGNAL_STORE_BYTES', 8*2**30))
+DERIVED_STORE_BYTES = int(os.environ.get('DERIVED_STORE_BYTES', 8*2**30))
+SPECTR_INDEX_CACHE_BYTES = int(os.environ.get('SPECTR_INDEX_CACHE_BYTES', 64*2**20))
+LOD_CACHE_BYTES = int(os.environ.get('LOD_CACHE_BYTES', 256*2**20))
+FILTER_CACHE_BYTES = int(os.environ.get('FILTER_CACHE_BYTES', 512*2**20))
+# memory-mapped filter outputs hold no heap bytes, so count them as well
+FILTER_CACHE_ENTRIES = int(os.environ.get('FILTER_CACHE_ENTRIES', 32))
+PULSE_CACHE_BYTES = int(os.environ.get('PULSE_CACHE_BYTES', 64*2**20))
+PSD_CACHE_BYTES = int(os.environ.get('PSD_CACHE_BYTES', 128*2**20))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+POLL_INTERVAL = 500
+
+# live mode (?signal=live) when LIVE_ADDRESS is set: host:port or a pipe path
+LIVE_SIGNAL_ID = 'live'
+LIVE_ADDRESS = os.environ.get('LIVE_ADDRESS')
+LIVE_DTYPE = os.environ.get('LIVE_DTYPE', 'int16')
+LIVE_SAMPLERATE = int(os.environ.get('LIVE_SAMPLERATE', TEXT_SAMPLERATE))
+LIVE_CAPACITY = int(os.environ.get('LIVE_CAPACITY', 2**22))
+LIVE_WINDOW = int(os.environ.get('LIVE_WINDOW', 2**18))
+LIVE_INTERVAL = int(os.environ.get('LIVE_INTERVAL', 1000))
+# spectr bins and 'lo,hi' range; integer dtypes default to their whole range
+LIVE_BINS = int(os.environ['LIVE_BINS']) if os.environ.get('LIVE_BINS') else None
+LIVE_LIM = (tuple(float(v) for v in os.environ['LIVE_LIM'].split(','))
+            if os.environ.get('LIVE_LIM') else None)
+# one JSON log line per timed stage
+METRICS_LOG = bool(os.environ.get('METRICS_LOG'))
 
 #==================================
 #   server
@@ -27,6 +82,10 @@ server = flask.Flask(__name__)
 server.secret_key = os.environ.get('secret_key', str(randint(0, 1000000)))
 app = dash.Dash(__name__, server=server)
 
+if METRICS_LOG:
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    METRICS.log = True
+
 #==================================
 #   style config
 #==================================
@@ -107,6 +166,42 @@ style_config_dict = {
                 'display': 'inline-block'
             }
         },
+        'samplerate-fild': {
+            'object': {
+                'display': 'inline-block',
+                'width': '90%',
+                'margin': '2%',
+                'backgroundColor': '#ffffff'
+            },
+            'text': {
+                'display': 'inline-block',
+                'marginRight': '10px'
+            }
+        },
+        'spec-mode-fild': {
+            'object': {
+                'display': 'inline-block',
+                'width': '90%',
+                'minHeight': '80px',
+                'margin': '2%',
+                'backgroundColor': '#ffffff'
+            },
+            'text': {
+                'display': 'inline-block'
+            }
+        },
+        'decim-fild': {
+            'object': {
+                'display': 'inline-block',
+                'width': '90%',
+                'minHeight': '80px',
+                'margin': '2%',
+                'backgroundColor': '#ffffff'
+            },
+            'text': {
+                'display': 'inline-block'
+            }
+        },
         'tl-time-wrap': {
             'object':{
                 'display': 'inline-block',
@@ -219,63 +314,287 @@ style_config_dict = {
 #=================================
 #   util.func.
 #=================================
-def avg_filter(arr, L, G=0):
-    length = len(arr)
-    filt_arr = [a for a in arr]
-    for i in range(length-L-G):
-        for j in range(L-1):
-            filt_arr[i] += arr[i+G+j+1]
-        filt_arr[i] /= L
-    for i in range(length-L-G, L+G):
-        filt_arr[i] = 0
-    return np.array(filt_arr)
-
-def trap_filter(arr, L, G=10):
-    arr_avg1 = avg_filter(arr, L, G=0)
-    arr_avg2 = avg_filter(arr, L, G=G)
-    return  arr_avg2-arr_avg1
-
-def time2spectr(data):
-    lim = 65536
-    spec = [0 for i in range(lim)]
-    for a in data:
-        a += 32768
-        if a < lim:
-            spec[int(a)] += 1
-    return spec
-
-def get_spectr_graphic(arr, smr, title='', name='', bound=None):
-    spec_lim = INIT_SPEC_BOUNDS
+# filter outputs are evicted against their own cap, never the uploads
+derived_store = SignalStore(os.path.join(SIGNAL_STORE_DIR, 'derived'),
+                            max_bytes=DERIVED_STORE_BYTES)
+signal_store = SignalStore(SIGNAL_STORE_DIR, max_bytes=SIGNAL_STORE_BYTES,
+                           derived=derived_store)
+chunked_uploads = ChunkedUploads(os.path.join(SIGNAL_STORE_DIR, 'uploads'))
+# a job not polled for a few intervals is no longer wanted by any session
+job_queue = JobQueue(workers=JOB_WORKERS, idle=4*POLL_INTERVAL/1000.)
+
+spectr_index_cache = LRUCache(SPECTR_INDEX_CACHE_BYTES)
+lod_cache = LRUCache(LOD_CACHE_BYTES)
+filter_cache = LRUCache(FILTER_CACHE_BYTES, max_entries=FILTER_CACHE_ENTRIES)
+pulse_cache = LRUCache(PULSE_CACHE_BYTES)
+psd_cache = LRUCache(PSD_CACHE_BYTES)
+
+init_data = []
+init_lock = threading.Lock()
+
+# one listener per process, so serve live mode from a single worker
+live_signal = None
+if LIVE_ADDRESS:
+    live_signal = live.LiveSignal(LIVE_CAPACITY, LIVE_SAMPLERATE, dtype=LIVE_DTYPE,
+                                  bins=LIVE_BINS, lim=LIVE_LIM)
+    live.start(live_signal, LIVE_ADDRESS)
+
+def get_init_data():
+    # memory-mapped, so every worker shares the page cache of the file
+    with init_lock:
+        if not init_data:
+            init_data.append(load_wav(INIT_PATH)[1])
+    return init_data[0]
+
+def background(cache, key, build, group=None):
+    # (value, job): cache[key] if present, else None and the background job
+    # running build(job), which puts its result into the cache. Unfinished
+    # jobs of the same group that no session polls any more are cancelled
+    value = cache.get(key)
+    if value is not None:
+        return value, None
+    job = job_queue.get(key)
+    if job is not None and job.status == 'failed':
+        return None, job
+    if job is not None and job.done and job.result is not None:
+        # too big for the cache, kept by the job
+        return job.result, None
+    def run(job):
+        value = build(job)
+        cache.put(key, value)
+        return None if key in cache else value
+    return None, job_queue.submit(key, run, group=group)
+
+def get_spectr_index(signal_id, arr):
+    def build(job):
+        with METRICS.timed('spectr_index', samples=len(arr)):
+            return SpectrIndex(arr)
+    return background(spectr_index_cache, ('index', signal_id), build)
+
+def filtered_signal(signal_id, data, samplerate, kind, L, G=0, job=None):
+    # whole-signal avg/trap output, filtered block by block into the derived
+    # store and memory-mapped from there
+    filt_id = '{}-{}-{}-{}'.format(signal_id, kind, L, G)
+    if not derived_store.exists(filt_id):
+        filter_blocks = avg_filter_blocks if kind == 'avg' else trap_filter_blocks
+        blocks = iter_blocks(data)
+        if job is not None:
+            blocks = job.track(blocks, len(data))
+        derived_store.put_blocks(filt_id, filter_blocks(blocks, L, G), len(data),
+                                 np.float64, samplerate, fmt='filter', source=signal_id)
+    return derived_store.get(filt_id)[1]
+
+def get_filtered(signal_id, data, samplerate, kind, L, G=0):
+    # whole-signal avg/trap output per (signal, L, G); windows are slices of
+    # it. Signals too big for the cache are filtered out of core instead
+    def build(job):
+        with METRICS.timed(kind+'_filter', samples=len(data)):
+            if 8*len(data) > FILTER_CACHE_BYTES//4:
+                return filtered_signal(signal_id, data, samplerate, kind, L, G, job=job)
+            if kind == 'avg':
+                return avg_filter_parallel(data, L, G)
+            return trap_filter_parallel(data, L, G)
+    return background(filter_cache, ('filter', signal_id, kind, L, G), build,
+                      group=('filter', signal_id, kind))
+
+def get_pulses(signal_id, data, L, G):
+    # PulseDetector over the trap output of the whole signal, streamed block
+    # by block; the spectr of any window histograms only its pulses
+    def build(job):
+        with METRICS.timed('pulses', samples=len(data)):
+            return detect_pulses(data, L, G, job=job)
+    return background(pulse_cache, ('pulses', signal_id, L, G), build,
+                      group=('pulses', signal_id))
+
+def get_psd(signal_id, data, samplerate, nperseg, start, end):
+    # Welch PSD of [start, end); the WelchIndex of (signal, window, segment
+    # size) keeps the segment sums, so a pan transforms only new segments
+    index_key = ('welch', signal_id, 'hann', nperseg)
+    index = psd_cache.get_or_create(index_key, lambda: WelchIndex(data, nperseg, 'hann'))
+    def build(job):
+        computed = index.computed
+        with METRICS.timed('psd', samples=end-start) as info:
+            result = index.psd(samplerate, start, end, job=job)
+            info['samples'] = (index.computed-computed)*index.nperseg
+        # the index grew, account for it again
+        psd_cache.put(index_key, index)
+        return result
+    return background(psd_cache, ('psd', signal_id, nperseg, start, end, samplerate), build,
+                      group=('psd', signal_id))
+
+def get_lod(key, build):
+    # LODPyramid of build() for key; None while it is built in the background
+    return background(lod_cache, ('lod',)+key, lambda job: LODPyramid(build()),
+                      group=('lod',)+key[:2])[0]
+
+def get_placeholder(poll_id, text, jobs):
+    # shown while jobs run; its id keeps the poll interval enabled, which
+    # re-runs the callback until they end
+    jobs = [job for job in jobs if job is not None]
+    failed = [job for job in jobs if job.status == 'failed']
+    if failed:
+        return [html.H5('{} failed: {}'.format(text, failed[0].error))]
+    progress = np.mean([job.progress for job in jobs]) if jobs else 0.
+    return [
+        html.H5(id=poll_id+'-wait', children='{} ... {:.0f}%'.format(text, 100*progress))
+    ]
+
+def is_waiting(poll_id, children):
+    # children of a graphic field, as a callback receives them, showing the
+    # placeholder of get_placeholder(poll_id, ...)
+    if not isinstance(children, list):
+        children = [children]
+    return any(isinstance(child, dict) and child.get('props', {}).get('id') == poll_id+'-wait'
+               for child in children)
+
+def get_spectr_graphic(arr, smr, title='', name='', bound=None, index=None):
     if bound is not None:
         time_lim = bound
     else:
         time_lim = [0, len(arr)]
-    return dcc.Graph(
-                id='spectr-graphic',
-                figure=go.Figure(
-                            data=[
-                                go.Scatter(
-                                    x=[i-int(AMPLITUDE) for i in range(2*AMPLITUDE)],
-                                    y=time2spectr(arr[int(time_lim[0]): int(time_lim[1])]),
-                                    line=style_config_dict['graphic-fild']['line1'],
-                                    opacity=0.8,
-                                    name=name
-                                )
-                            ],
-                            layout=go.Layout(
-                                title='Spectr '+str(title),
-                                paper_bgcolor=colors['paper_bg'],
-                                plot_bgcolor=colors['plot_bg'],
-                                xaxis=dict(
-                                    rangeslider={},
-                                    range=spec_lim
-                                )
-                            )
+    with METRICS.timed('time2spectr', samples=int(time_lim[1])-int(time_lim[0])):
+        spec, layout = window_spectr(arr, time_lim[0], time_lim[1], index)
+    spec_lim = INIT_SPEC_BOUNDS if layout == (-AMPLITUDE, 1, 2*AMPLITUDE) else None
+    with METRICS.timed('spectr_figure', samples=len(spec)):
+        figure = go.Figure(
+                    data=[
+                        go.Scatter(
+                            line=style_config_dict['graphic-fild']['line1'],
+                            opacity=0.8,
+                            name=name,
+                            **spectr_trace(spec, layout)
+                        )
+                    ],
+                    layout=go.Layout(
+                        title='Spectr '+str(title),
+                        paper_bgcolor=colors['paper_bg'],
+                        plot_bgcolor=colors['plot_bg'],
+                        xaxis=dict(
+                            rangeslider={},
+                            range=spec_lim
                         )
                     )
+                )
+    return dcc.Graph(id='spectr-graphic', figure=figure)
+
+
+def get_pulse_graphic(pulses, smr, title='', bound=None):
+    start, end = (0, None) if bound is None else bound
+    with METRICS.timed('pulse_spectr', samples=pulses.accepted):
+        spec = pulses.spectr(start, end)
+    name = 'pulses, {} piled up, {} dead, {:.2f} s live'.format(
+        pulses.piled_up, pulses.dead, pulses.live_time/float(smr))
+    with METRICS.timed('spectr_figure', samples=len(spec)):
+        figure = go.Figure(
+                    data=[
+                        go.Scatter(
+                            line=style_config_dict['graphic-fild']['line3'],
+                            opacity=0.8,
+                            name=name,
+                            **spectr_trace(spec, pulses.layout)
+                        )
+                    ],
+                    layout=go.Layout(
+                        title='Pulse height spectr '+str(title),
+                        paper_bgcolor=colors['paper_bg'],
+                        plot_bgcolor=colors['plot_bg'],
+                        xaxis=dict(
+                            rangeslider={}
+                        )
+                    )
+                )
+    return dcc.Graph(id='spectr-graphic', figure=figure)
+
+
+def get_live_time_graphic(L, G, samplerate=None):
+    # newest LIVE_WINDOW samples; the interval re-runs the callback while
+    # the live signal is shown
+    smr = samplerate or live_signal.samplerate
+    live_signal.set_filter(L, G)
+    start, raw, avg, trap, total = live_signal.snapshot(LIVE_WINDOW)
+    title = 'live, {} samples'.format(total)
+    with METRICS.timed('time_figure', samples=len(raw)):
+        traces = time_traces([raw, avg, trap], start, smr, 'minmax', points=TIME_GRAPHIC_POINTS)
+        time_figure = go.Figure(
+                    data=[
+                        go.Scatter(
+                            line=style_config_dict['graphic-fild'][line],
+                            opacity=0.8,
+                            name=trace_name,
+                            **trace
+                        )
+                        for trace, line, trace_name in zip(
+                            traces, ['line1', 'line2', 'line3'],
+                            ['obt. data', 'avg. filter', 'trap. filter'])
+                    ],
+                    layout=go.Layout(
+                        title='Time Series '+title,
+                        paper_bgcolor=colors['paper_bg'],
+                        plot_bgcolor=colors['plot_bg']
+                    )
+                )
+    return [dcc.Graph(id='time-graphic', figure=time_figure)]
+
+
+def get_live_spectr_graphic():
+    # spectr of everything received, updated per block as it arrives
+    counts, total = live_signal.spectr()
+    title = 'live, {} samples'.format(total)
+    layout = live_signal.layout
+    with METRICS.timed('spectr_figure', samples=len(counts)):
+        spectr_figure = go.Figure(
+                    data=[
+                        go.Scatter(
+                            line=style_config_dict['graphic-fild']['line1'],
+                            opacity=0.8,
+                            name='obt. data',
+                            **spectr_trace(counts, layout)
+                        )
+                    ],
+                    layout=go.Layout(
+                        title='Spectr '+title,
+                        paper_bgcolor=colors['paper_bg'],
+                        plot_bgcolor=colors['plot_bg'],
+                        xaxis=dict(
+                            rangeslider={}
+                        )
+                    )
+                )
+    return [dcc.Graph(id='spectr-graphic', figure=spectr_figure)]
 
 
-def get_time_graphic(arr, smr, L, G, title='', name='', bound=None):
+def get_psd_graphic(freqs, density, segments, title=''):
+    if density is None:
+        return html.H5('PSD: the window is shorter than one segment')
+    with METRICS.timed('spectr_figure', samples=len(density)):
+        figure = go.Figure(
+                    data=[
+                        go.Scatter(
+                            x0=0,
+                            dx=freqs[1],
+                            y=density,
+                            line=style_config_dict['graphic-fild']['line2'],
+                            opacity=0.8,
+                            name='Welch, {} segments'.format(segments)
+                        )
+                    ],
+                    layout=go.Layout(
+                        title='PSD '+str(title),
+                        paper_bgcolor=colors['paper_bg'],
+                        plot_bgcolor=colors['plot_bg'],
+                        xaxis=dict(
+                            rangeslider={},
+                            title='Hz'
+                        ),
+                        yaxis=dict(
+                            type='log'
+                        )
+                    )
+                )
+    return dcc.Graph(id='spectr-graphic', figure=figure)
+
+
+def get_time_graphic(arr, smr, filtered, title='', name='', bound=None, decim='minmax', lods=None):
     if bound is None:
         lim = INIT_TIME_BOUNDS
     else:
@@ -285,44 +604,37 @@ def get_time_graphic(arr, smr, L, G, title='', name='', bound=None):
 
     elif lim[0]>len(arr)/smr:
         lim[0]=len(arr)/smr
-    print('get time graphic')
-    return dcc.Graph(
-                id='time-graphic',
-                figure=go.Figure(
-                            data=[
-                                go.Scatter(
-                                    x=[(smr*lim[0]+i)/smr for i in range(int(smr*(lim[1]-lim[0])))],
-                                    y=arr[int(smr*lim[0]):int(smr*lim[1])],
-                                    line=style_config_dict['graphic-fild']['line1'],
-                                    opacity=0.8,
-                                    name = 'obt. data'
-                                ),
-                                go.Scatter(
-                                    x=[(smr*lim[0]+i)/smr for i in range(int(smr*(lim[1]-lim[0])))],
-                                    y=avg_filter(arr[int(smr*lim[0]):int(smr*lim[1])], L=L),
-                                    line=style_config_dict['graphic-fild']['line2'],
-                                    opacity=0.8,
-                                    name = 'avg. filter'
-                                ),
-                                go.Scatter(
-                                    x=[(smr*lim[0]+i)/smr for i in range(int(smr*(lim[1]-lim[0])))],
-                                    y=trap_filter(arr[int(smr*lim[0]):int(smr*lim[1])], L=L, G=G),
-                                    line=style_config_dict['graphic-fild']['line3'],
-                                    opacity=0.8,
-                                    name = 'trap. filter'
-                                )
-                            ],
-                            layout=go.Layout(
-                                title='Time Series '+str(title),
-                                paper_bgcolor=colors['paper_bg'],
-                                plot_bgcolor=colors['plot_bg'],
-                                xaxis=dict(
-                                    rangeslider={},
-                                    range=[lim[0], lim[1]]
-                                )
-                            )
+    i0, i1 = int(smr*lim[0]), int(smr*lim[1])
+    traces = [
+        (arr, 'line1', 'obt. data'),
+        (filtered[0], 'line2', 'avg. filter'),
+        (filtered[1], 'line3', 'trap. filter')
+    ]
+    with METRICS.timed('time_figure', samples=i1-i0):
+        ys = [y for y, _, _ in traces]
+        data = [
+            go.Scatter(
+                line=style_config_dict['graphic-fild'][line],
+                opacity=0.8,
+                name=trace_name,
+                **trace
+            )
+            for trace, (_, line, trace_name) in zip(
+                window_traces(ys, i0, i1, smr, decim, lods, TIME_GRAPHIC_POINTS), traces)
+        ]
+        figure = go.Figure(
+                    data=data,
+                    layout=go.Layout(
+                        title='Time Series '+str(title),
+                        paper_bgcolor=colors['paper_bg'],
+                        plot_bgcolor=colors['plot_bg'],
+                        xaxis=dict(
+                            rangeslider={},
+                            range=[lim[0], lim[1]]
                         )
                     )
+                )
+    return dcc.Graph(id='time-graphic', figure=figure)
 
 #=================================
 #   Canva
@@ -330,6 +642,7 @@ def get_time_graphic(arr, smr, L, G, title='', name='', bound=None):
 app.layout = html.Div(
     id='general',
     children=[
+        dcc.Location(id='url', refresh=False),
         html.Div(
             id='header',
             children=[
@@ -359,6 +672,29 @@ app.layout = html.Div(
                     style=style_config_dict['work-panel']['upload-file']['object'],
                     multiple=False
                 ),
+                # id of the uploaded signal in signal_store
+                html.Div(
+                    id='signal-id',
+                    children=INIT_SIGNAL_ID,
+                    style={'display': 'none'}
+                ),
+                html.Div(
+                    id='samplerate-fild',
+                    children=[
+                        html.H5(
+                            id='samplerate-header',
+                            children='Sample rate of *.txt, Hz',
+                            style=style_config_dict['work-panel']['samplerate-fild']['text']
+                        ),
+                        dcc.Input(
+                            id='input-samplerate',
+                            type='number',
+                            placeholder=str(TEXT_SAMPLERATE),
+                            min=1
+                        )
+                    ],
+                    style=style_config_dict['work-panel']['samplerate-fild']['object']
+                ),
                 html.Div(
                     id='rangeslider-fild',
                     children=[
@@ -372,11 +708,11 @@ app.layout = html.Div(
                                 dcc.RangeSlider(
                                     id='rangeslider-time',
                                     marks={
-                                        i:'{}s'.format(i) for i in range(0, int(len(INIT_DATA)/float(INIT_SMR)), 5)
+                                        i:'{}s'.format(i) for i in range(0, INIT_DURATION, 5)
                                     },
                                     value=INIT_TIME_BOUNDS,
                                     min=0,
-                                    max=int(len(INIT_DATA)/float(INIT_SMR)),
+                                    max=INIT_DURATION,
                                     dots=True,
                                     step=0.1,
                                     vertical=True
@@ -413,6 +749,59 @@ app.layout = html.Div(
                     ],
                     style=style_config_dict['work-panel']['radioitem-fild']['object']
                 ),
+                html.Div(
+                    id='spec-mode-fild',
+                    children=[
+                        html.H5(
+                            id='spec-mode-header',
+                            children='Spectr of',
+                            style=style_config_dict['work-panel']['spec-mode-fild']['text']
+                        ),
+                        dcc.RadioItems(
+                            id='radioitem-spec-mode',
+                            options=[
+                                {'label': 'samples', 'value': 'samples'},
+                                {'label': 'pulse heights (trap. filter)', 'value': 'pulses'},
+                                {'label': 'PSD (Welch)', 'value': 'psd'},
+                            ],
+                            value='samples',
+                            labelStyle={'display': 'inline-block'}
+                        ),
+                        html.H5(
+                            id='psd-segment-header',
+                            children='PSD segment, num.points',
+                            style=style_config_dict['work-panel']['spec-mode-fild']['text']
+                        ),
+                        dcc.RadioItems(
+                            id='radioitem-psd-segment',
+                            options=[{'label': str(n), 'value': n} for n in PSD_SEGMENTS],
+                            value=4096,
+                            labelStyle={'display': 'inline-block'}
+                        )
+                    ],
+                    style=style_config_dict['work-panel']['spec-mode-fild']['object']
+                ),
+                html.Div(
+                    id='decim-fild',
+                    children=[
+                        html.H5(
+                            id='decim-header',
+                            children='Decimation of time series',
+                            style=style_config_dict['work-panel']['decim-fild']['text']
+                        ),
+                        dcc.RadioItems(
+                            id='radioitem-decim',
+                            options=[
+                                {'label': 'min/max', 'value': 'minmax'},
+                                {'label': 'LTTB', 'value': 'lttb'},
+                                {'label': 'off', 'value': None},
+                            ],
+                            value='minmax',
+                            labelStyle={'display': 'inline-block'}
+                        )
+                    ],
+                    style=style_config_dict['work-panel']['decim-fild']['object']
+                ),
                 html.Div(
                     id='filter-param',
                     children=[
@@ -488,7 +877,11 @@ app.layout = html.Div(
                 html.Div(
                     id='time-fild',
                     style=style_config_dict['graphic-fild']['time-fild']['object']
-                )
+                ),
+                # re-run the graphic callbacks while their jobs run, and
+                # continuously in live mode
+                dcc.Interval(id='spectr-poll', interval=POLL_INTERVAL, disabled=True),
+                dcc.Interval(id='time-poll', interval=POLL_INTERVAL, disabled=True)
             ],
             style=style_config_dict['graphic-fild']['object']
         ),
@@ -517,23 +910,9 @@ app.layout = html.Div(
 #=================================
 #   reaction
 #=================================
-def parse_content_type(s):
-    s = s.split(';')[-2].split('-')[-1]
-    return s
-
-
 def parse_contents(contents, filename):
-    content_type, content_string = contents.split(',')
-    content_format = parse_content_type(content_type)
-    decoded = base64.b64decode(content_string)
     try:
-        if content_format == 'wav':
-            samplerate, data = wavfile.read(
-                                io.BytesIO(decoded)
-                               )
-        elif content_format != 'wav':
-            data = np.loadtxt(io.BytesIO(decoded))
-            samplerate = 10**8
+        samplerate, data = parse_upload(contents)
     except Exception as e:
         print(e)
         return None
@@ -541,46 +920,365 @@ def parse_contents(contents, filename):
     return samplerate, data, name
 
 
-@app.callback(Output('spectr-fild', 'children'),
+def timed_callback(func):
+    # marks when the callback returns; dash JSON-encodes the output right
+    # after, so after_request times only the encoding from callback_end
+    @functools.wraps(func)
+    def wrapper(*args):
+        try:
+            return func(*args)
+        finally:
+            flask.g.callback_end = time.perf_counter()
+    return wrapper
+
+
+def contents_key(contents):
+    return hashlib.sha1(contents.encode()).hexdigest()
+
+
+def is_live(signal_id):
+    return signal_id == LIVE_SIGNAL_ID and live_signal is not None
+
+
+def load_signal(signal_id, samplerate=None):
+    # (samplerate, data, title, signal_id) of a stored signal, data is memory-mapped;
+    # a declared samplerate replaces the default one of text signals.
+    # None while the signal is still being ingested or when ingesting failed
+    if signal_id is None or signal_id == INIT_SIGNAL_ID:
+        return INIT_SMR, get_init_data(), 'init.', INIT_SIGNAL_ID
+    if not signal_store.exists(signal_id):
+        job = job_queue.get(('ingest', signal_id))
+        if job is not None and (job.active or job.status == 'failed'):
+            return None
+        return INIT_SMR, get_init_data(), 'init.', INIT_SIGNAL_ID
+    stored_smr, data, name = signal_store.get(signal_id)
+    if not samplerate or signal_store.meta(signal_id).get('format') == 'wav':
+        samplerate = stored_smr
+    return samplerate, data, name, signal_id
+
+
+def ingest_contents(job, signal_id, contents, filename):
+    parsed = parse_contents(contents, filename)
+    if parsed is None:
+        raise ValueError('cannot parse {}'.format(filename))
+    samplerate, data, name = parsed
+    job.check(0.5)
+    signal_store.put(signal_id, data, samplerate, name, fmt=parse_content_type(contents.split(',')[0]))
+    get_lod((signal_id, 'raw'), lambda: data)
+
+
+@app.callback(Output('signal-id', 'children'),
               [Input('upload-file', 'contents'),
                Input('upload-file', 'filename'),
+               Input('url', 'search')])
+@timed_callback
+def ingest_upload(contents, filename, search):
+    # the only callback that sees the upload body; the graphics get the id
+    # and wait for the ingest job. Files sent to /upload are opened with ?signal=<id>
+    if contents is None:
+        signal_id = parse_qs((search or '').lstrip('?')).get('signal', [None])[0]
+        if is_live(signal_id):
+            return signal_id
+        if signal_id is not None and (signal_store.exists(signal_id) or
+                                      job_queue.get(('ingest', signal_id)) is not None):
+            return signal_id
+        return INIT_SIGNAL_ID
+    signal_id = contents_key(contents)
+    if not signal_store.exists(signal_id):
+        job_queue.submit(('ingest', signal_id),
+                         lambda job: ingest_contents(job, signal_id, contents, filename))
+    return signal_id
+
+
+@app.callback(Output('spectr-fild', 'children'),
+              [Input('signal-id', 'children'),
+               Input('input-samplerate', 'value'),
                Input('rangeslider-time', 'value'),
-               Input('radioitem-spec', 'value')])
-def update_spec_graphic(list_of_contents, list_of_names, time_value, spec_value):
-    if list_of_contents is not None:
-        samplerate, data, title = parse_contents(list_of_contents, list_of_names)
-    else:
-        samplerate, data, title = INIT_SMR, INIT_DATA, 'init.'
+               Input('radioitem-spec', 'value'),
+               Input('radioitem-spec-mode', 'value'),
+               Input('tl-time', 'value'),
+               Input('tg-time', 'value'),
+               Input('radioitem-psd-segment', 'value'),
+               Input('spectr-poll', 'n_intervals')])
+@timed_callback
+def update_spec_graphic(signal_id, declared_smr, time_value, spec_value, spec_mode, tl, tg, nperseg, n_poll):
+    if is_live(signal_id):
+        return get_live_spectr_graphic()
+    loaded = load_signal(signal_id, declared_smr)
+    if loaded is None:
+        return get_placeholder('spectr-poll', 'Loading signal', [job_queue.get(('ingest', signal_id))])
+    samplerate, data, title, signal_id = loaded
 
     if spec_value is None:
         value = [int(time_value[0]*samplerate), int(time_value[1]*samplerate)]
     else:
         value = [0, int(len(data)*spec_value)]
 
+    if spec_mode == 'pulses':
+        pulses, job = get_pulses(signal_id, data, tl[1], tg[1])
+        if pulses is None:
+            return get_placeholder('spectr-poll', 'Detecting pulses', [job])
+        return [get_pulse_graphic(pulses, samplerate, title=title, bound=value)]
+
+    if spec_mode == 'psd':
+        # always the time series region, panning it reuses the segments
+        start, end = int(time_value[0]*samplerate), int(time_value[1]*samplerate)
+        result, job = get_psd(signal_id, data, samplerate, nperseg, start, end)
+        if result is None:
+            return get_placeholder('spectr-poll', 'Computing PSD', [job])
+        return [get_psd_graphic(*result, title=title)]
+
+    index, job = get_spectr_index(signal_id, data)
+    if index is None:
+        return get_placeholder('spectr-poll', 'Indexing spectr', [job])
     children = [
-        get_spectr_graphic(data, samplerate, name='obt. data', title=title, bound=value)
+        get_spectr_graphic(data, samplerate, name='obt. data', title=title, bound=value, index=index)
     ]
     return children
 
 
 @app.callback(Output('time-fild', 'children'),
-              [Input('upload-file', 'contents'),
-               Input('upload-file', 'filename'),
+              [Input('signal-id', 'children'),
+               Input('input-samplerate', 'value'),
                Input('rangeslider-time', 'value'),
                Input('tl-time', 'value'),
-               Input('tg-time', 'value')])
-def update_time_graphic(list_of_contents, list_of_names, time_value, tl, tg):
-    if list_of_contents is not None:
-        samplerate, data, title = parse_contents(list_of_contents, list_of_names)
-    else:
-        samplerate, data, title = INIT_SMR, INIT_DATA, 'init.'
+               Input('tg-time', 'value'),
+               Input('radioitem-decim', 'value'),
+               Input('time-poll', 'n_intervals')])
+@timed_callback
+def update_time_graphic(signal_id, declared_smr, time_value, tl, tg, decim, n_poll):
+    if is_live(signal_id):
+        return get_live_time_graphic(tl[1], tg[1], declared_smr)
+    loaded = load_signal(signal_id, declared_smr)
+    if loaded is None:
+        return get_placeholder('time-poll', 'Loading signal', [job_queue.get(('ingest', signal_id))])
+    samplerate, data, title, signal_id = loaded
     l = tl[1]
     g = tg[1]
+    avg, avg_job = get_filtered(signal_id, data, samplerate, 'avg', l)
+    trap, trap_job = get_filtered(signal_id, data, samplerate, 'trap', l, g)
+    if avg is None or trap is None:
+        return get_placeholder('time-poll', 'Filtering', [avg_job, trap_job])
+    lods = None
+    if decim is not None:
+        lods = [
+            get_lod((signal_id, 'raw'), lambda: data),
+            get_lod((signal_id, 'avg', l), lambda: avg),
+            get_lod((signal_id, 'trap', l, g), lambda: trap)
+        ]
     children = [
-            get_time_graphic(data, samplerate,L=l, G=g, title=title, bound=time_value)
+            get_time_graphic(data, samplerate, [avg, trap], title=title, bound=time_value,
+                             decim=decim, lods=lods)
         ]
     return children
 
 
+@app.callback(Output('spectr-poll', 'disabled'),
+              [Input('spectr-fild', 'children')],
+              [State('signal-id', 'children')])
+def toggle_spectr_poll(children, signal_id):
+    return not (is_live(signal_id) or is_waiting('spectr-poll', children))
+
+
+@app.callback(Output('time-poll', 'disabled'),
+              [Input('time-fild', 'children')],
+              [State('signal-id', 'children')])
+def toggle_time_poll(children, signal_id):
+    return not (is_live(signal_id) or is_waiting('time-poll', children))
+
+
+@app.callback(Output('spectr-poll', 'interval'),
+              [Input('signal-id', 'children')])
+def spectr_poll_interval(signal_id):
+    return LIVE_INTERVAL if is_live(signal_id) else POLL_INTERVAL
+
+
+@app.callback(Output('time-poll', 'interval'),
+              [Input('signal-id', 'children')])
+def time_poll_interval(signal_id):
+    return LIVE_INTERVAL if is_live(signal_id) else POLL_INTERVAL
+
+
+#=================================
+#   metrics
+#=================================
+def cache_stat(field):
+    caches = {'spectr_index': spectr_index_cache, 'lod': lod_cache, 'filter': filter_cache,
+              'pulse': pulse_cache, 'psd': psd_cache}
+    return lambda: {(('cache', name),): cache.stats()[field] for name, cache in caches.items()}
+
+METRICS.gauge('cache_bytes', cache_stat('nbytes'), 'Bytes held per cache.')
+METRICS.gauge('cache_items', cache_stat('items'), 'Entries per cache.')
+METRICS.counter('cache_hits', cache_stat('hits'), 'Cache hits since start.')
+METRICS.counter('cache_misses', cache_stat('misses'), 'Cache misses since start.')
+METRICS.gauge('jobs_active', lambda: {(): sum(job.active for job in list(job_queue.jobs.values()))},
+              'Background jobs pending or running.')
+
+
+@server.before_request
+def start_timer():
+    flask.g.request_start = time.perf_counter()
+
+
+@server.after_request
+def record_request(response):
+    # dash callbacks are labelled by their output component
+    if not flask.request.path.endswith('_dash-update-component'):
+        return response
+    now = time.perf_counter()
+    seconds = now-flask.g.get('request_start', now)
+    body = flask.request.get_json(silent=True) or {}
+    output = body.get('output', {}).get('id', '')
+    nbytes = response.calculate_content_length() or 0
+    METRICS.observe('callback', seconds, nbytes=nbytes, callback=output)
+    callback_end = flask.g.get('callback_end')
+    if callback_end is not None:
+        METRICS.observe('serialize', now-callback_end, nbytes=nbytes, callback=output)
+    return response
+
+
+@server.route('/metrics')
+def metrics():
+    # Prometheus text format
+    return flask.Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+
+#=================================
+#   upload routes
+#=================================
+@server.route('/upload/<upload_id>', methods=['GET', 'POST', 'PUT'])
+def chunked_upload(upload_id):
+    # POST/PUT /upload/<id>?offset=<bytes>[&total=<bytes>] with a raw chunk
+    # as body; GET reports the progress, to resume from 'received'
+    try:
+        if flask.request.method == 'GET':
+            return flask.jsonify(chunked_uploads.status(upload_id))
+        status = chunked_uploads.write(
+            upload_id,
+            flask.request.stream,
+            offset=flask.request.args.get('offset', 0, type=int),
+            total=flask.request.args.get('total', None, type=int)
+        )
+    except ValueError as e:
+        return flask.jsonify(error=str(e)), 409
+    return flask.jsonify(status)
+
+
+@server.route('/upload/<upload_id>/finish', methods=['POST'])
+def finish_upload(upload_id):
+    # POST /upload/<id>/finish?filename=<name>[&samplerate=<Hz>]
+    # the ingest runs as a job; the page shows 'Loading signal' meanwhile
+    try:
+        signal_id, ingest = chunked_uploads.finish(
+            upload_id,
+            signal_store,
+            filename=flask.request.args.get('filename'),
+            samplerate=flask.request.args.get('samplerate', None, type=int)
+        )
+    except ValueError as e:
+        return flask.jsonify(error=str(e)), 400
+    job_queue.submit(('ingest', signal_id), lambda job: ingest())
+    return flask.jsonify(signal_id=signal_id, url='/?signal='+signal_id)
+
+
+#=================================
+#   export routes
+#=================================
+def metered(chunks, samples):
+    # export bytes in /metrics, counted as they are sent
+    with METRICS.timed('export', samples=samples) as info:
+        for chunk in chunks:
+            info['nbytes'] += len(chunk)
+            yield chunk
+
+
+def export_response(chunks, fmt, length, dtype, filename):
+    headers = {'Content-Disposition': 'attachment; filename='+filename}
+    size = content_length(fmt, length, dtype)
+    if size is not None:
+        headers['Content-Length'] = str(size)
+    return flask.Response(metered(chunks, length), mimetype=EXPORT_FORMATS[fmt][0],
+                          headers=headers)
+
+
+def export_signal(signal_id):
+    # (samplerate, data, i0, i1) of ?start=<s>&end=<s>[&samplerate=<Hz>],
+    # or raises a ValueError / KeyError for the error response
+    if signal_id != INIT_SIGNAL_ID and not signal_store.exists(signal_id):
+        raise KeyError(signal_id)
+    args = flask.request.args
+    loaded = load_signal(signal_id, args.get('samplerate', None, type=int))
+    samplerate, data = loaded[0], loaded[1]
+    i0 = int(args.get('start', 0., type=float)*samplerate)
+    i1 = int(args.get('end', len(data)/float(samplerate), type=float)*samplerate)
+    i0, i1 = max(i0, 0), min(i1, len(data))
+    if i1 <= i0:
+        raise ValueError('empty time range')
+    if args.get('format', 'npy') not in EXPORT_FORMATS:
+        raise ValueError('format is one of '+', '.join(sorted(EXPORT_FORMATS)))
+    return samplerate, data, i0, i1
+
+
+@server.route('/export/<signal_id>/filter')
+def export_filter(signal_id):
+    # GET /export/<id>/filter?kind=trap&L=10&G=10&start=<s>&end=<s>&format=npy|int16|float32|csv,
+    # streamed block by block; a whole-signal output already cached is sliced
+    args = flask.request.args
+    kind = args.get('kind', 'trap')
+    L = args.get('L', 10, type=int)
+    G = args.get('G', 10 if kind == 'trap' else 0, type=int)
+    fmt = args.get('format', 'npy')
+    try:
+        if kind not in ('avg', 'trap') or L < 1 or G < 0:
+            raise ValueError('kind is avg or trap, L >= 1, G >= 0')
+        samplerate, data, i0, i1 = export_signal(signal_id)
+    except KeyError:
+        return flask.jsonify(error='no signal '+signal_id), 404
+    except ValueError as e:
+        return flask.jsonify(error=str(e)), 400
+    cached = filter_cache.get(('filter', signal_id, kind, L, G))
+    if cached is not None:
+        blocks = iter_blocks(cached[i0:i1])
+    elif kind == 'avg':
+        blocks = avg_filter_range(data, L, G, i0, i1)
+    else:
+        blocks = trap_filter_range(data, L, G, i0, i1)
+    chunks = encode_blocks(blocks, fmt, i1-i0, np.float64, ('time', kind),
+                           x0=i0/float(samplerate), dx=1./samplerate)
+    filename = '{}-{}-{}-{}.{}'.format(signal_id, kind, L, G, EXPORT_FORMATS[fmt][2])
+    return export_response(chunks, fmt, i1-i0, np.float64, filename)
+
+
+@server.route('/export/<signal_id>/spectr')
+def export_spectr(signal_id):
+    # GET /export/<id>/spectr?start=<s>&end=<s>&format=npy|float32|csv, the
+    # histogram of the samples in the range, one row per bin
+    fmt = flask.request.args.get('format', 'npy')
+    try:
+        if fmt == 'int16':
+            raise ValueError('counts do not fit int16, use npy, float32 or csv')
+        samplerate, data, i0, i1 = export_signal(signal_id)
+    except KeyError:
+        return flask.jsonify(error='no signal '+signal_id), 404
+    except ValueError as e:
+        return flask.jsonify(error=str(e)), 400
+    index = spectr_index_cache.get(('index', signal_id))
+    layout = spectr_layout(data) if index is None else index.layout
+
+    def spectr():
+        # counted inside the response, so the headers go out at once
+        if index is not None:
+            yield index.spectr(i0, i1)
+            return
+        spec = np.zeros(layout[2], dtype=np.int64)
+        for block in iter_blocks(data[i0:i1]):
+            spec += time2spectr(block, layout=layout)
+        yield spec
+    lo, step, nbins = layout
+    chunks = encode_blocks(spectr(), fmt, nbins, np.int64, ('amplitude', 'count'), x0=lo, dx=step)
+    filename = '{}-spectr.{}'.format(signal_id, EXPORT_FORMATS[fmt][2])
+    return export_response(chunks, fmt, nbins, np.int64, filename)
+
+
 if __name__ == '__main__':
     app.server.run(debug=True)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Trap-filtered signals and amplitude spectra for many files, without dash.
+
+    python batch.py input/ -o out/ -L 10 -G 10
+    python batch.py 'runs/*.txt' -o out/ --format csv --workers 4
+
+Writes <file>.npz (trap, spectr_x, spectr, samplerate, L, G) or
+<file>_trap.csv and <file>_spectr.csv per input, and out/summary.csv with
+one row per file as it finishes. <file> keeps the input's path below the
+directory common to all inputs, so same-named files do not collide. Text
+inputs are parsed once into .npy sidecars in --store and memory-mapped
+from there on later runs.
+"""
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from dsp import iter_blocks, trap_filter, trap_filter_blocks
+from dsp import spectr_layout, spectr_axis, time2spectr
+from loaders import load_text, load_wav, parse_text, TEXT_SAMPLERATE
+from store import SignalStore, DEFAULT_ROOT as DEFAULT_STORE_ROOT
+
+
+EXTENSIONS = ('.wav', '.txt')
+SUMMARY_FIELDS = ['file', 'samples', 'samplerate', 'L', 'G', 'seconds', 'output', 'error']
+
+
+#==================================
+#   one file
+#==================================
+def load_file(path, samplerate=None, store=None):
+    # (samplerate, data); wav samples are memory-mapped, text is parsed into
+    # store (if given) once and mapped from there afterwards
+    if path.lower().endswith('.wav'):
+        return load_wav(path)[:2]
+    if store is not None:
+        return load_text(path, samplerate or TEXT_SAMPLERATE, store)[:2]
+    with open(path, 'rb') as f:
+        data = parse_text(f)
+    return samplerate or TEXT_SAMPLERATE, data
+
+
+def block_spectr(data, layout):
+    # time2spectr of data, one block in memory at a time
+    spec = np.zeros(layout[2], dtype=np.int64)
+    for block in iter_blocks(data):
+        spec += time2spectr(block, layout=layout)
+    return spec
+
+
+def write_csv(path, header, rows):
+    # rows: iterable of 2-column arrays, written as they come
+    with open(path, 'w') as f:
+        f.write(header+'\n')
+        for row in rows:
+            np.savetxt(f, row, delimiter=',', fmt='%.10g')
+
+
+def process_file(path, out_dir, L, G, samplerate=None, fmt='npz', bins=None, name=None,
+                 store=None):
+    # summary row of one file, written to out_dir/name (the basename by
+    # default); errors are reported in the row, not raised
+    t0 = time.perf_counter()
+    row = {'file': path, 'L': L, 'G': G}
+    try:
+        samplerate, data = load_file(path, samplerate, store)
+        row.update(samples=len(data), samplerate=samplerate)
+        layout = spectr_layout(data, bins=bins)
+        spec = block_spectr(data, layout)
+        axis = spectr_axis(layout)
+        base = os.path.join(out_dir, name or os.path.basename(path))
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        if fmt == 'npz':
+            row['output'] = base+'.npz'
+            np.savez(row['output'], trap=trap_filter(data, L, G), spectr_x=axis,
+                     spectr=spec, samplerate=samplerate, L=L, G=G)
+        else:
+            def trap_rows():
+                i0 = 0
+                for block in trap_filter_blocks(iter_blocks(data), L, G):
+                    t = (i0+np.arange(len(block)))/float(samplerate)
+                    yield np.column_stack([t, block])
+                    i0 += len(block)
+            write_csv(base+'_trap.csv', 'time,trap', trap_rows())
+            start, stop = np.flatnonzero(spec)[[0, -1]] if spec.any() else (0, -1)
+            write_csv(base+'_spectr.csv', 'amplitude,count',
+                      [np.column_stack([axis[start:stop+1], spec[start:stop+1]])])
+            row['output'] = base+'_trap.csv'
+    except Exception as e:
+        row['error'] = '{}: {}'.format(type(e).__name__, e)
+    row['seconds'] = round(time.perf_counter()-t0, 3)
+    return row
+
+
+#==================================
+#   many files
+#==================================
+def find_files(patterns):
+    # directories are searched for *.wav and *.txt, anything else is a glob
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = [os.path.join(pattern, name) for name in os.listdir(pattern)
+                     if name.lower().endswith(EXTENSIONS)]
+        else:
+            found = glob.glob(pattern)
+        paths.extend(sorted(p for p in found if os.path.isfile(p)))
+    # overlapping patterns would process (and write) a file twice
+    unique, seen = [], set()
+    for path in paths:
+        if os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            unique.append(path)
+    return unique
+
+
+def output_names(paths):
+    # paths below the deepest directory holding all of them, so a/x.wav
+    # and b/x.wav do not overwrite each other
+    paths = [os.path.abspath(p) for p in paths]
+    if not paths:
+        return []
+    root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    return [os.path.relpath(p, root) for p in paths]
+
+
+def run(paths, out_dir, L, G, samplerate=None, fmt='npz', bins=None, workers=None,
+        store=None):
+    # yields the summary rows in completion order
+    args = (out_dir, L, G, samplerate, fmt, bins)
+    names = output_names(paths)
+    if workers == 1 or len(paths) <= 1:
+        for path, name in zip(paths, names):
+            yield process_file(path, *args, name=name, store=store)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_file, path, *args, name=name, store=store)
+                   for path, name in zip(paths, names)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('paths', nargs='+', help='files, directories or globs')
+    parser.add_argument('-o', '--out', default='out', help='output directory')
+    parser.add_argument('-L', type=int, default=10, help='filter length, samples')
+    parser.add_argument('-G', type=int, default=10, help='filter gap, samples')
+    parser.add_argument('--samplerate', type=int, default=None,
+                        help='samplerate of text files, Hz (default {})'.format(TEXT_SAMPLERATE))
+    parser.add_argument('--format', choices=('npz', 'csv'), default='npz')
+    parser.add_argument('--bins', type=int, default=None,
+                        help='spectr bins (default one per code for 16 bit data)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes (default one per cpu)')
+    parser.add_argument('--store', default=DEFAULT_STORE_ROOT,
+                        help='directory of parsed text sidecars (default %(default)s)')
+    parser.add_argument('--no-store', action='store_true',
+                        help='parse text files on every run')
+    args = parser.parse_args(argv)
+
+    paths = find_files(args.paths)
+    if not paths:
+        parser.error('no files found')
+    if not os.path.isdir(args.out):
+        os.makedirs(args.out)
+    failed = 0
+    with open(os.path.join(args.out, 'summary.csv'), 'w') as f:
+        writer = csv.DictWriter(f, SUMMARY_FIELDS)
+        writer.writeheader()
+        store = None if args.no_store else SignalStore(args.store)
+        rows = run(paths, args.out, args.L, args.G, args.samplerate,
+                   args.format, args.bins, args.workers, store)
+        for k, row in enumerate(rows):
+            writer.writerow(row)
+            f.flush()
+            failed += bool(row.get('error'))
+            print('[{}/{}] {} {}'.format(k+1, len(paths), row['file'],
+                                         row.get('error') or '{} s'.format(row['seconds'])))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
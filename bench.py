@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+"""Timings for the dsp kernels; equivalence checks live in tests/.
+
+    python bench.py            # N = 1e4 .. 1e7
+    python bench.py --max 8    # up to N = 1e8
+    python bench.py --save base.json             # store a baseline
+    python bench.py --baseline base.json         # exit 1 on slowdowns
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import dsp
+import loaders
+import parallel
+import payload
+import psd
+import pulses
+from tests.reference import make_pulses, make_signal, ref_avg_filter, ref_time2spectr
+
+
+#==================================
+#   helpers
+#==================================
+def load_init_data(path='input/wave400.wav'):
+    # the app's default recording, or a signal of the same shape
+    if os.path.exists(path):
+        from scipy.io import wavfile
+        return wavfile.read(path)[1]
+    return make_signal(400*44100)
+
+
+def timeit(func, *args, **kwargs):
+    # best of `repeat` calls; setup() gives fresh args to each call, untimed
+    repeat = kwargs.pop('repeat', 3)
+    setup = kwargs.pop('setup', None)
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            args = setup()
+        t0 = time.perf_counter()
+        func(*args, **kwargs)
+        dt = time.perf_counter()-t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def peakmem(func, *args, **kwargs):
+    # (peak bytes allocated, result) of one call (numpy buffers are traced
+    # too; memory-mapped files are not)
+    setup = kwargs.pop('setup', None)
+    if setup is not None:
+        args = setup()
+    tracemalloc.start()
+    try:
+        result = func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+
+RESULTS = []
+
+
+def report(name, n, dt, peak=None, nbytes=None):
+    RESULTS.append({'name': name, 'n': n, 'seconds': dt,
+                    'samples_per_s': n/dt, 'peak_bytes': peak, 'bytes': nbytes})
+    line = '{:<28} N={:<10d} {:10.4f} s  {:10.2f} Msamples/s'.format(
+        name, n, dt, n/dt/1e6)
+    if peak is not None:
+        line += '  {:10.1f} MB peak'.format(peak/2**20)
+    if nbytes is not None:
+        line += '  {:10.1f} kB'.format(nbytes/1e3)
+    print(line)
+
+
+def measure(name, n, func, *args, **kwargs):
+    # best-of timing plus one traced run for the peak memory, whose result
+    # is returned; serialized (str) results also record their size
+    dt = timeit(func, *args, **kwargs)
+    kwargs.pop('repeat', None)
+    peak, result = peakmem(func, *args, **kwargs)
+    nbytes = len(result) if isinstance(result, str) else None
+    report(name, n, dt, peak, nbytes)
+    return result
+
+
+#==================================
+#   benchmarks
+#==================================
+def bench_kernels(max_exp):
+    for e in range(4, max_exp+1):
+        n = 10**e
+        arr = make_signal(n)
+        if n <= 10**5:
+            measure('ref_avg_filter L=100', n, ref_avg_filter, arr, 100, 10, repeat=1)
+        for L in (10, 100):
+            measure('avg_filter L={}'.format(L), n, dsp.avg_filter, arr, L, 10)
+        measure('trap_filter L=100', n, dsp.trap_filter, arr, 100, 10)
+        measure('time2spectr', n, dsp.time2spectr, arr)
+
+
+def bench_filter_grid(n=10**6):
+    # one entry per (L, G) of the tl-time/tg-time sliders
+    arr = make_signal(n)
+    for L in (1, 10, 50, 100):
+        for G in (0, 10, 50, 100):
+            measure('avg_filter L={} G={}'.format(L, G), n, dsp.avg_filter, arr, L, G)
+            measure('trap_filter L={} G={}'.format(L, G), n, dsp.trap_filter, arr, L, G)
+
+
+def bench_sig_files(L=10, G=10):
+    for path in ('input/sig_1.txt', 'input/sig_2.txt'):
+        with open(path, 'rb') as f:
+            arr = loaders.parse_text(f)
+        name = os.path.basename(path)
+        measure('avg_filter ' + name, len(arr), dsp.avg_filter, arr, L, G)
+        measure('trap_filter ' + name, len(arr), dsp.trap_filter, arr, L, G)
+        measure('time2spectr ' + name, len(arr), dsp.time2spectr, arr)
+
+
+def bench_trap_sweep(n=10**6):
+    # the full tl-time x tg-time grid in steps of 10
+    arr = make_signal(n)
+    L, G = np.meshgrid(np.arange(10, 101, 10), np.arange(0, 101, 10))
+
+    def loop():
+        for l, g in zip(L.ravel(), G.ravel()):
+            dsp.trap_filter(arr, int(l), int(g))
+    measure('trap_filter x{} (loop)'.format(L.size), n, loop, repeat=1)
+    measure('trap_filter_multi x{}'.format(L.size), n,
+            dsp.trap_filter_multi, arr, L, G, repeat=1)
+
+
+def bench_filter_blocks(n=10**7):
+    arr = make_signal(n)
+
+    def run():
+        for _ in dsp.trap_filter_blocks(dsp.iter_blocks(arr), 100, 10):
+            pass
+    measure('trap_filter_blocks L=100', n, run)
+
+
+def bench_parallel(max_workers, n=10**7):
+    arr = make_signal(n)
+    for workers in range(1, max_workers+1):
+        measure('trap_filter_parallel w={}'.format(workers), n,
+                parallel.trap_filter_parallel, arr, 100, 10, workers)
+        measure('time2spectr_parallel w={}'.format(workers), n,
+                parallel.time2spectr_parallel, arr, workers=workers)
+
+
+def bench_time2spectr():
+    arr = load_init_data()
+    n = len(arr)
+    measure('ref_time2spectr INIT_DATA', n, ref_time2spectr, arr, repeat=1)
+    measure('time2spectr INIT_DATA', n, dsp.time2spectr, arr)
+    arr = make_signal(n, np.float64)
+    measure('time2spectr float64', n, dsp.time2spectr, arr)
+
+
+def bench_spectr_index():
+    arr = load_init_data()
+    n = len(arr)
+    index = measure('SpectrIndex build', n, dsp.SpectrIndex, arr, repeat=1)
+    print('SpectrIndex block_size={} nbytes={:.1f} MB'.format(
+        index.block_size, index.nbytes/2**20))
+    for start, end in ((0, n), (n//3, n//2), (1000, 50000)):
+        measure('SpectrIndex.spectr', end-start, index.spectr, start, end)
+
+
+def bench_decimate(n=10**7):
+    arr = make_signal(n, np.float64)
+    for mode in ('minmax', 'lttb'):
+        measure('decimate {} -> 2000'.format(mode), n,
+                dsp.decimate, arr, 2000, mode=mode)
+
+
+def bench_lod_pyramid():
+    arr = load_init_data()
+    n = len(arr)
+    lod = measure('LODPyramid build', n, dsp.LODPyramid, arr, repeat=1)
+    print('LODPyramid levels={} nbytes={:.1f} MB'.format(
+        len(lod.levels), lod.nbytes/2**20))
+    for start, end in ((0, n), (n//3, n//2), (1000, 10**6)):
+        measure('LODPyramid.query', end-start, lod.query, start, end, 2000)
+
+
+def bench_pulses(max_exp):
+    for e in range(5, max_exp+1):
+        n = 10**e
+        arr = make_pulses(n, n//1000)
+        measure('detect_pulses', n, pulses.detect_pulses, arr, 10, 20)
+
+
+def bench_psd(n=10**7, nperseg=4096):
+    arr = make_signal(n)
+    window = n//2
+
+    def fresh():
+        return psd.WelchIndex(arr, nperseg),
+
+    def panned():
+        index = psd.WelchIndex(arr, nperseg)
+        index.psd(44100, 0, window)
+        return index,
+    measure('WelchIndex.psd first', n, lambda index: index.psd(44100),
+            setup=fresh, repeat=1)
+    # a pan by a tenth of the window reuses all but the new segments
+    pan = lambda index: index.psd(44100, n//20, n//20+window)
+    measure('WelchIndex.psd pan', window, pan, setup=panned, repeat=1)
+    index, = panned()
+    computed = index.computed
+    pan(index)
+    print('WelchIndex pan transformed {} of {} segments'.format(
+        index.computed-computed, window//index.step))
+
+
+def bench_parse_text():
+    for path in ('input/sig_1.txt', 'input/sig_2.txt'):
+        n = len(np.loadtxt(path))
+
+        def parse():
+            with open(path, 'rb') as f:
+                loaders.parse_text(f)
+        measure('np.loadtxt ' + os.path.basename(path), n, np.loadtxt, path)
+        measure('parse_text ' + os.path.basename(path), n, parse)
+
+
+def to_json(obj):
+    # what the figure costs on the wire: plotly's encoder when installed,
+    # else the same tolist() conversion it applies to numpy arrays
+    try:
+        from plotly.utils import PlotlyJSONEncoder
+        return json.dumps(obj, cls=PlotlyJSONEncoder)
+    except ImportError:
+        return json.dumps(obj, default=lambda a: a.tolist())
+
+
+#==================================
+#   app entry points, without dash
+#==================================
+def data_url(arr, fmt, smr=44100):
+    # what dcc.Upload hands to parse_contents
+    f = io.BytesIO()
+    if fmt == 'wav':
+        from scipy.io import wavfile
+        wavfile.write(f, smr, arr)
+        content_type = 'data:audio/x-wav'
+    else:
+        np.savetxt(f, arr, fmt='%d')
+        content_type = 'data:text/plain'
+    return content_type + ';base64,' + base64.b64encode(f.getvalue()).decode()
+
+
+def time_figure(ys, i0, i1, smr, decim, lods):
+    # get_time_graphic's traces of cached whole-signal outputs, serialized
+    # the way dash sends them (no plotly validation)
+    return to_json(payload.window_traces(ys, i0, i1, smr, decim, lods))
+
+
+def spectr_figure(arr, start, end, index):
+    # get_spectr_graphic's trace from the signal's SpectrIndex, serialized
+    return to_json(payload.spectr_trace(*payload.window_spectr(arr, start, end, index)))
+
+
+def bench_parse_contents(max_exp):
+    # base64 data urls grow by 4/3 on top of the file, so N stops at 1e7
+    # for wav and 1e6 for txt
+    for fmt, top in (('wav', 7), ('txt', 6)):
+        for e in range(4, min(max_exp, top)+1):
+            n = 10**e
+            contents = data_url(make_signal(n), fmt)
+            measure('parse_contents ' + fmt, n, loaders.parse_upload, contents)
+    for path in ('input/sig_1.txt', 'input/sig_2.txt'):
+        with open(path, 'rb') as f:
+            contents = 'data:text/plain;base64,' + base64.b64encode(f.read()).decode()
+        n = len(loaders.parse_upload(contents)[1])
+        measure('parse_contents ' + os.path.basename(path), n, loaders.parse_upload, contents)
+
+
+def bench_figures(max_exp, smr=44100, L=10, G=10):
+    # what a request costs once the signal's filter outputs, pyramids and
+    # SpectrIndex are cached: the whole signal, then a 2 s window of it
+    for e in range(4, max_exp+1):
+        n = 10**e
+        arr = make_signal(n)
+        ys = [arr, parallel.avg_filter_parallel(arr, L),
+              parallel.trap_filter_parallel(arr, L, G)]
+        lods = [dsp.LODPyramid(y) for y in ys]
+        index = dsp.SpectrIndex(arr)
+        windows = [(0, n)]
+        if n > 4*smr:
+            windows.append((n//3, n//3+2*smr))
+        for i0, i1 in windows:
+            suffix = '' if i1-i0 == n else ' 2s'
+            for decim in ('minmax', 'lttb'):
+                measure('time_figure ' + decim + suffix, i1-i0, time_figure,
+                        ys, i0, i1, smr, decim, lods)
+            measure('spectr_figure' + suffix, i1-i0, spectr_figure, arr, i0, i1, index)
+
+
+#==================================
+#   results
+#==================================
+def save_results(path):
+    meta = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': RESULTS}, f, indent=1)
+    print('saved {} results to {}'.format(len(RESULTS), path))
+
+
+def compare(path, tolerance):
+    # entries whose throughput fell, or whose serialized size grew, by more
+    # than `tolerance` against the baseline at the same (name, N)
+    with open(path) as f:
+        baseline = json.load(f)
+    base = {(r['name'], r['n']): r for r in baseline['results']}
+    worse = []
+    print('against {} ({})'.format(path, baseline['meta'].get('time', '')))
+    for r in RESULTS:
+        b = base.get((r['name'], r['n']))
+        if b is None:
+            continue
+        ratio = r['samples_per_s']/b['samples_per_s']
+        mark = ''
+        if ratio < 1-tolerance:
+            mark = '  SLOWER'
+        if r.get('bytes') and b.get('bytes') and r['bytes'] > b['bytes']*(1+tolerance):
+            mark += '  LARGER x{:.2f}'.format(r['bytes']/b['bytes'])
+        if mark:
+            worse.append(r)
+        print('{:<28} N={:<10d} x{:6.2f}{}'.format(r['name'], r['n'], ratio, mark))
+    print('{} of {} entries slower or larger than the baseline by more than {:.0f}%'.format(
+        len(worse), len(RESULTS), 100*tolerance))
+    return worse
+
+
+def bench_payload(smr=44100, seconds=2, L=10, G=10):
+    # figure data before and after the compact encodings; the sizes go into
+    # the results so --baseline catches payload growth too
+    arr = load_init_data()
+    i0, i1 = 0, smr*seconds
+    window = arr[i0:i1]
+    ys = [window, dsp.avg_filter(window, L), dsp.trap_filter(window, L, G)]
+    before = [{'x': [(i0+i)/float(smr) for i in range(i1-i0)], 'y': y} for y in ys]
+    layout = dsp.spectr_layout(arr)
+    spec = dsp.time2spectr(arr[:len(arr)//16], layout=layout)
+    spec_before = [{'x': [layout[0]+i*layout[1] for i in range(len(spec))], 'y': list(spec)}]
+    for name, n, data in (('payload time, before', i1-i0, lambda: before),
+                          ('payload time, x0/dx', i1-i0,
+                           lambda: payload.time_traces(ys, i0, smr, None)),
+                          ('payload time, decimated', i1-i0,
+                           lambda: payload.time_traces(ys, i0, smr, 'minmax')),
+                          ('payload spectr, before', len(spec), lambda: spec_before),
+                          ('payload spectr, trimmed', len(spec),
+                           lambda: [payload.spectr_trace(spec, layout)])):
+        measure(name, n, lambda data: to_json(data()), data)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max', type=int, default=7,
+                        help='largest N as a power of ten')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='largest worker count for the scaling run')
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--baseline', help='json file of an earlier --save to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed throughput loss against the baseline')
+    args = parser.parse_args()
+    bench_kernels(args.max)
+    bench_filter_grid()
+    bench_sig_files()
+    bench_trap_sweep()
+    bench_filter_blocks()
+    bench_parallel(args.workers)
+    bench_time2spectr()
+    bench_spectr_index()
+    bench_decimate()
+    bench_lod_pyramid()
+    bench_pulses(args.max)
+    bench_psd()
+    bench_parse_text()
+    bench_parse_contents(args.max)
+    bench_figures(args.max)
+    bench_payload()
+    if args.save:
+        save_results(args.save)
+    if args.baseline and compare(args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import collections
+import threading
+
+import numpy as np
+
+
+def nbytes_of(value):
+    # memory held by numpy arrays inside value (tuples/lists/dicts are
+    # walked); memory-mapped arrays live in the page cache and count as 0
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes_of(v) for v in value)
+    if isinstance(value, dict):
+        return sum(nbytes_of(v) for v in value.values())
+    return 0
+
+
+class LRUCache(object):
+    # least-recently-used cache bounded by the total size of its values and,
+    # for values sizeof does not see (memmaps), by max_entries
+    def __init__(self, max_bytes, sizeof=nbytes_of, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizeof = sizeof
+        self.items = collections.OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.items.move_to_end(key)
+            return self.items[key][0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self.items:
+                self.nbytes -= self.items.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self.items[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes or self._too_many():
+                self.nbytes -= self.items.popitem(last=False)[1][1]
+        return value
+
+    def _too_many(self):
+        return self.max_entries is not None and len(self.items) > self.max_entries
+
+    def get_or_create(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {
+            'items': len(self.items),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+#==================================
+#   prefix sums
+#==================================
+def _acc_dtype(arr):
+    # integer samples are summed exactly, everything else in double
+    if arr.dtype.kind in 'biu':
+        return np.int64
+    return np.float64
+
+
+def prefix_sum(arr):
+    arr = np.asarray(arr)
+    csum = np.zeros(len(arr)+1, dtype=_acc_dtype(arr))
+    np.cumsum(arr, dtype=csum.dtype, out=csum[1:])
+    return csum
+
+
+#==================================
+#   filters
+#==================================
+def _avg_range(arr, csum, L, G, lo, hi, base=0, length=None):
+    # avg_filter values for indices [lo, hi) of a signal of `length`
+    # samples; arr[k] is sample base+k and csum[k] its prefix sum
+    length = base+len(arr) if length is None else length
+    out = np.zeros(max(hi-lo, 0), dtype=np.float64)
+    m = length - L - G
+    if m <= 0:
+        return out
+    a, b = lo-base, min(hi, m)-base
+    if b > a:
+        out[:b-a] = (arr[a:b] + (csum[G+L+a:G+L+b] - csum[G+1+a:G+1+b])) / float(L)
+    a = max(lo, m, L+G)
+    if hi > a:
+        out[a-lo:] = arr[a-base:hi-base]
+    return out
+
+
+def avg_filter(arr, L, G=0):
+    # out[i] = (arr[i] + sum(arr[i+G+1 : i+G+L])) / L  for i < N-L-G,
+    # out[N-L-G : L+G] = 0, the rest of the tail keeps the raw samples
+    arr = np.asarray(arr)
+    return _avg_range(arr, prefix_sum(arr), L, G, 0, len(arr))
+
+
+def _trap_range(arr, csum, L, G, lo, hi, base=0, length=None):
+    # trap_filter values for indices [lo, hi), arguments as in _avg_range
+    length = base+len(arr) if length is None else length
+    out = np.zeros(max(hi-lo, 0), dtype=np.float64)
+    if G == 0:
+        return out
+    m = min(max(length - L - G, lo), hi)
+    if m > lo:
+        # arr[i] cancels between the two windows
+        a, b = lo-base, m-base
+        out[:m-lo] = ((csum[G+L+a:G+L+b] - csum[G+1+a:G+1+b])
+                      - (csum[L+a:L+b] - csum[1+a:1+b])) / float(L)
+    if hi > m:
+        out[m-lo:] = (_avg_range(arr, csum, L, G, m, hi, base, length)
+                      - _avg_range(arr, csum, L, 0, m, hi, base, length))
+    return out
+
+
+def trap_filter(arr, L, G=10):
+    arr = np.asarray(arr)
+    return _trap_range(arr, prefix_sum(arr), L, G, 0, len(arr))
+
+
+def trap_filter_multi(arr, L, G=10, csum=None):
+    # evaluate trap_filter for every (L, G) pair (L and G are broadcast
+    # together) from one prefix sum; returns an array of shape (pairs, N)
+    arr = np.asarray(arr)
+    L, G = np.broadcast_arrays(np.asarray(L, dtype=np.int64),
+                               np.asarray(G, dtype=np.int64))
+    L, G = L.ravel(), G.ravel()
+    if csum is None:
+        csum = prefix_sum(arr)
+    out = np.empty((len(L), len(arr)), dtype=np.float64)
+    for k in range(len(L)):
+        out[k] = _trap_range(arr, csum, int(L[k]), int(G[k]), 0, len(arr))
+    return out
+
+
+#==================================
+#   chunked filters
+#==================================
+BLOCK_SIZE = 2**20
+
+
+def iter_blocks(arr, block_size=BLOCK_SIZE):
+    for i in range(0, len(arr), block_size):
+        yield arr[i:i+block_size]
+
+
+class BlockFilter(object):
+    # kernel over blocks pushed one at a time, keeping an L+G sample halo;
+    # the prefix sum is continued sequentially, so the concatenated output
+    # is bit-identical to filtering the whole array. Integer prefix sums
+    # are rebased to the halo after every block (exact); rebase=True does
+    # the same for floats, bounding the sum on endless streams at the cost
+    # of bit-identity. push() returns the samples that became final,
+    # flush() the rest
+    def __init__(self, L, G, kernel, rebase=False):
+        self.L, self.G, self.kernel = L, G, kernel
+        self.rebase = rebase
+        self.buf, self.csum, self.base = None, None, 0
+
+    def push(self, block):
+        block = np.asarray(block)
+        if self.buf is None:
+            self.buf, self.csum = block, prefix_sum(block)
+        else:
+            acc = np.empty(len(block)+1, dtype=self.csum.dtype)
+            acc[0], acc[1:] = self.csum[-1], block
+            self.buf = np.concatenate([self.buf, block])
+            self.csum = np.concatenate([self.csum, np.cumsum(acc, dtype=self.csum.dtype)[1:]])
+        base = self.base
+        known = base+len(self.buf)
+        ready = known-self.L-self.G
+        if ready <= base:
+            return np.zeros(0)
+        out = self.kernel(self.buf, self.csum, self.L, self.G, base, ready, base, known)
+        self.buf, self.csum, self.base = self.buf[ready-base:], self.csum[ready-base:], ready
+        if self.rebase or self.csum.dtype.kind in 'iu':
+            # the kernels only take differences of the prefix sum
+            self.csum = self.csum - self.csum[0]
+        return out
+
+    def flush(self):
+        if self.buf is None or not len(self.buf):
+            return np.zeros(0)
+        base = self.base
+        known = base+len(self.buf)
+        out = self.kernel(self.buf, self.csum, self.L, self.G, base, known, base, known)
+        self.buf, self.csum, self.base = self.buf[:0], self.csum[-1:], known
+        return out
+
+
+def _filter_blocks(blocks, L, G, kernel):
+    f = BlockFilter(L, G, kernel)
+    for block in blocks:
+        out = f.push(block)
+        if len(out):
+            yield out
+    out = f.flush()
+    if len(out):
+        yield out
+
+
+def avg_filter_blocks(blocks, L, G=0):
+    return _filter_blocks(blocks, L, G, _avg_range)
+
+
+def trap_filter_blocks(blocks, L, G=10):
+    return _filter_blocks(blocks, L, G, _trap_range)
+
+
+def _range_blocks(data, L, G, kernel, start, end, block_size):
+    # each output block [lo, hi) reads data[lo:hi+L+G] only, so any range
+    # of a long (memory-mapped) signal is filtered in O(block_size) memory;
+    # integer signals give exactly the whole-signal values
+    length = len(data)
+    end = length if end is None else min(end, length)
+    for lo in range(max(start, 0), end, block_size):
+        hi = min(lo+block_size, end)
+        arr = np.asarray(data[lo:min(hi+L+G, length)])
+        yield kernel(arr, prefix_sum(arr), L, G, lo, hi, lo, length)
+
+
+def avg_filter_range(data, L, G=0, start=0, end=None, block_size=BLOCK_SIZE):
+    return _range_blocks(data, L, G, _avg_range, start, end, block_size)
+
+
+def trap_filter_range(data, L, G=10, start=0, end=None, block_size=BLOCK_SIZE):
+    return _range_blocks(data, L, G, _trap_range, start, end, block_size)
+
+
+#==================================
+#   spectr
+#==================================
+def spectr_layout(data, bins=None, lim=None):
+    # histogram layout (lo, step, nbins); bin k covers [lo+k*step, lo+(k+1)*step)
+    # integer samples up to 16 bit get one bin per code by default, any
+    # other dtype is binned over `lim` (data min/max if not given)
+    data = np.asarray(data)
+    kind, size = data.dtype.kind, data.dtype.itemsize
+    if bins is None and lim is None and kind in 'biu' and size <= 2:
+        if kind == 'b':
+            return 0, 1, 2
+        info = np.iinfo(data.dtype)
+        return int(info.min), 1, 2**(8*size)
+    if lim is None:
+        if len(data) == 0:
+            lim = (0, 1)
+        elif kind in 'biu':
+            lim = (int(data.min()), int(data.max())+1)
+        else:
+            finite = data[np.isfinite(data)]
+            lim = (float(finite.min()), float(finite.max())) if len(finite) else (0, 1)
+    lo, hi = lim
+    if bins is None:
+        bins = 2**16
+        if kind in 'biu':
+            bins = int(min(hi-lo, bins))
+    bins = max(int(bins), 1)
+    step = (hi-lo)/float(bins) if hi > lo else 1.
+    while lo+step*bins < hi:
+        # keep the upper limit inside the last bin despite rounding
+        step = float(np.nextafter(step, np.inf))
+    return lo, step, bins
+
+
+def spectr_axis(layout):
+    lo, step, nbins = layout
+    return lo + step*np.arange(nbins)
+
+
+def time2spectr(data, bins=None, lim=None, layout=None):
+    data = np.asarray(data)
+    if data.dtype.kind == 'b':
+        data = data.view(np.uint8)
+    if layout is None:
+        layout = spectr_layout(data, bins=bins, lim=lim)
+    lo, step, nbins = layout
+    if data.dtype.kind in 'iu' and step == 1:
+        idx = data.astype(np.intp) - int(lo)
+        idx = idx[(idx >= 0) & (idx < nbins)]
+    else:
+        data = data[(data >= lo) & (data <= lo+step*nbins)]
+        if data.dtype.kind in 'iu':
+            # data-lo overflows the input dtype for wide integer ranges
+            data = data.astype(np.float64)
+        # the upper edge is inclusive, like np.histogram
+        idx = np.minimum(((data-lo)/step).astype(np.intp), nbins-1)
+    return np.bincount(idx, minlength=nbins)
+
+
+class SpectrIndex(object):
+    # cumulative per-block histograms of one signal: the spectr of any
+    # [start, end) is the difference of two block prefixes plus the two
+    # partial edge blocks. Only bins that occur in the signal are stored,
+    # and the block size grows until the table fits in max_bytes.
+    def __init__(self, data, layout=None, block_size=None, max_bytes=16*2**20):
+        self.data = np.asarray(data)
+        self.layout = spectr_layout(self.data) if layout is None else layout
+        length = len(self.data)
+        total = time2spectr(self.data, layout=self.layout)
+        self.active = np.flatnonzero(total)
+        count_dtype = np.uint32 if length < 2**32 else np.uint64
+        itemsize = np.dtype(count_dtype).itemsize
+        if block_size is None:
+            block_size = 2**12
+            while (length//block_size+1)*len(self.active)*itemsize > max_bytes:
+                block_size *= 2
+        self.block_size = int(block_size)
+        nblocks = length//self.block_size
+        self.cum = np.zeros((nblocks+1, len(self.active)), dtype=count_dtype)
+        running = np.zeros(len(self.active), dtype=np.int64)
+        for b in range(nblocks):
+            block = self.data[b*self.block_size:(b+1)*self.block_size]
+            running += time2spectr(block, layout=self.layout)[self.active]
+            self.cum[b+1] = running
+
+    @property
+    def nbytes(self):
+        return self.cum.nbytes + self.active.nbytes
+
+    def spectr(self, start=0, end=None):
+        length = len(self.data)
+        end = length if end is None else end
+        start, end = max(int(start), 0), min(int(end), length)
+        if end <= start:
+            return np.zeros(self.layout[2], dtype=np.int64)
+        bs = self.block_size
+        b0 = min(-(-start//bs), len(self.cum)-1)
+        b1 = min(end//bs, len(self.cum)-1)
+        if b1 <= b0:
+            return time2spectr(self.data[start:end], layout=self.layout)
+        spec = time2spectr(self.data[start:b0*bs], layout=self.layout)
+        spec += time2spectr(self.data[b1*bs:end], layout=self.layout)
+        spec[self.active] += (self.cum[b1]-self.cum[b0]).astype(np.int64)
+        return spec
+
+
+#==================================
+#   decimation
+#==================================
+def minmax_indices(y, n_out):
+    # indices of the min and max of each of n_out//2 buckets, in time order
+    y = np.asarray(y)
+    length = len(y)
+    if length <= n_out or n_out < 2:
+        return np.arange(length)
+    nb = n_out//2
+    b = -(-length//nb)
+    nfull = length//b
+    head = y[:nfull*b].reshape(nfull, b)
+    base = np.arange(nfull)*b
+    idx = [np.stack([base+head.argmin(axis=1), base+head.argmax(axis=1)], axis=1)]
+    if nfull*b < length:
+        tail = y[nfull*b:]
+        idx.append([[nfull*b+tail.argmin(), nfull*b+tail.argmax()]])
+    idx = np.sort(np.concatenate(idx), axis=1).ravel()
+    # flat buckets give min == max
+    return idx[np.concatenate([[True], np.diff(idx) != 0])]
+
+
+def lttb_indices(y, n_out):
+    # Largest-Triangle-Three-Buckets on a uniformly sampled signal
+    y = np.asarray(y, dtype=np.float64)
+    length = len(y)
+    if length <= n_out or n_out < 3:
+        return np.arange(length)
+    edges = np.linspace(1, length-1, n_out-1).astype(np.intp)
+    out = np.empty(n_out, dtype=np.intp)
+    out[0], out[-1] = 0, length-1
+    a = 0
+    for i in range(n_out-2):
+        lo, hi = edges[i], edges[i+1]
+        if i+2 < len(edges):
+            nlo, nhi = edges[i+1], edges[i+2]
+            cx, cy = (nlo+nhi-1)/2., y[nlo:nhi].mean()
+        else:
+            cx, cy = length-1., y[-1]
+        bx = np.arange(lo, hi)
+        area = np.abs((a-cx)*(y[lo:hi]-y[a]) - (a-bx)*(cy-y[a]))
+        a = lo+int(area.argmax())
+        out[i+1] = a
+    return out
+
+
+DECIMATE_MODES = {
+    'minmax': minmax_indices,
+    'lttb': lttb_indices
+}
+
+
+def decimate(y, n_out, mode='minmax'):
+    # sample indices to plot for y; everything when it already fits n_out
+    if mode is None or len(y) <= n_out:
+        return np.arange(len(y))
+    return DECIMATE_MODES[mode](y, n_out)
+
+
+#==================================
+#   level of detail
+#==================================
+def _reduce_blocks(arr, f):
+    # min/max/mean of consecutive blocks of f samples (the last may be short)
+    length = len(arr)
+    nfull = length//f
+    head = arr[:nfull*f].reshape(nfull, f)
+    mins, maxs = head.min(axis=1), head.max(axis=1)
+    means = head.mean(axis=1, dtype=np.float64)
+    if nfull*f < length:
+        tail = arr[nfull*f:]
+        mins = np.append(mins, tail.min())
+        maxs = np.append(maxs, tail.max())
+        means = np.append(means, tail.mean(dtype=np.float64))
+    return mins.astype(np.float32), maxs.astype(np.float32), means.astype(np.float32)
+
+
+def _reduce_pairs(level):
+    mins, maxs, means = level
+    if len(mins) % 2:
+        mins, maxs, means = [np.append(a, a[-1]) for a in (mins, maxs, means)]
+    return (np.minimum(mins[0::2], mins[1::2]),
+            np.maximum(maxs[0::2], maxs[1::2]),
+            (means[0::2]+means[1::2])/2)
+
+
+class LODPyramid(object):
+    # float32 min/max/mean summaries of a signal at factors
+    # 2**min_level, 2**(min_level+1), ... ; about 24/2**min_level bytes per
+    # sample in total (1.5 bytes with the default min_level=4)
+    def __init__(self, data, min_level=4, min_length=256):
+        data = np.asarray(data)
+        self.length = len(data)
+        self.min_level = min_level
+        self.levels = []
+        level = _reduce_blocks(data, 2**min_level)
+        while True:
+            self.levels.append(level)
+            if len(level[0]) <= min_length:
+                break
+            level = _reduce_pairs(level)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for level in self.levels for a in level)
+
+    def factor(self, k):
+        return 2**(self.min_level+k)
+
+    def select(self, i0, i1, n_buckets):
+        # finest level with at most n_buckets buckets in [i0, i1), None
+        # when even the finest level is too coarse for the window
+        span = max(i1-i0, 1)
+        if span <= n_buckets*self.factor(0):
+            return None
+        for k in range(len(self.levels)):
+            if span <= n_buckets*self.factor(k):
+                return k
+        return len(self.levels)-1
+
+    def query(self, i0, i1, n_out, mode='minmax'):
+        # (sample positions, values) for [i0, i1) in at most ~n_out points,
+        # None if the raw samples should be used instead
+        i0, i1 = max(int(i0), 0), min(int(i1), self.length)
+        n_buckets = n_out//2 if mode == 'minmax' else n_out
+        k = self.select(i0, i1, max(n_buckets, 1))
+        if k is None:
+            return None
+        f = self.factor(k)
+        b0, b1 = i0//f, -(-i1//f)
+        mins, maxs, means = [a[b0:b1] for a in self.levels[k]]
+        pos = (np.arange(b0, b1)*f + (f-1)/2.)
+        if mode not in ('minmax', 'lttb'):
+            return pos, means
+        pos, val = np.repeat(pos, 2), np.stack([mins, maxs], axis=1).ravel()
+        if mode == 'lttb':
+            # over the min/max envelope; block means would flatten spikes
+            idx = lttb_indices(val, n_out)
+            return pos[idx], val[idx]
+        return pos, val
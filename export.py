@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import io
+
+import numpy as np
+
+
+# format: (mimetype, sample dtype, file suffix); raw formats are
+# headerless little-endian samples
+EXPORT_FORMATS = {
+    'npy': ('application/octet-stream', None, 'npy'),
+    'int16': ('application/octet-stream', '<i2', 'raw'),
+    'float32': ('application/octet-stream', '<f4', 'raw'),
+    'csv': ('text/csv', None, 'csv')
+}
+
+
+def npy_header(dtype, length):
+    # .npy header of a 1-d array; the samples follow as raw bytes
+    f = io.BytesIO()
+    np.lib.format.write_array_header_1_0(f, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False,
+        'shape': (int(length),)
+    })
+    return f.getvalue()
+
+
+def out_dtype(fmt, dtype):
+    if fmt == 'npy':
+        return np.dtype(dtype).newbyteorder('<')
+    return np.dtype(EXPORT_FORMATS[fmt][1])
+
+
+def content_length(fmt, length, dtype):
+    # bytes of a binary export, None for csv
+    if fmt == 'csv':
+        return None
+    out = out_dtype(fmt, dtype)
+    head = len(npy_header(out, length)) if fmt == 'npy' else 0
+    return head + out.itemsize*int(length)
+
+
+def _convert(block, out):
+    if out.kind in 'iu' and block.dtype.kind == 'f':
+        # rounded and clipped to the integer range
+        info = np.iinfo(out)
+        block = np.clip(np.round(block), info.min, info.max)
+    return block.astype(out).tobytes()
+
+
+def encode_blocks(blocks, fmt, length, dtype, columns=('x', 'y'), x0=0., dx=1.):
+    # bytes of `length` values arriving in blocks: .npy, raw samples, or
+    # csv rows 'x,y' with x = x0 + k*dx for the k-th value
+    if fmt == 'csv':
+        yield (','.join(columns)+'\n').encode()
+        k = 0
+        for block in blocks:
+            f = io.StringIO()
+            x = x0 + dx*np.arange(k, k+len(block))
+            np.savetxt(f, np.column_stack([x, block]), delimiter=',', fmt='%.10g')
+            k += len(block)
+            yield f.getvalue().encode()
+        return
+    out = out_dtype(fmt, dtype)
+    if fmt == 'npy':
+        yield npy_header(out, length)
+    for block in blocks:
+        yield _convert(np.asarray(block), out)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job(object):
+    def __init__(self, key, group):
+        self.key = key
+        self.group = group
+        self.status = 'pending'
+        self.progress = 0.
+        self.result = None
+        self.error = None
+        self.seen = time.monotonic()
+        self.cancel_event = threading.Event()
+
+    @property
+    def done(self):
+        return self.status == 'done'
+
+    @property
+    def active(self):
+        return self.status in ('pending', 'running')
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check(self, progress=None):
+        # called by the job function between steps
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.key)
+        if progress is not None:
+            self.progress = progress
+
+    def track(self, blocks, total):
+        # pass blocks through, updating progress and stopping on cancel
+        seen = 0
+        for block in blocks:
+            self.check(seen/float(total) if total else None)
+            seen += len(block)
+            yield block
+        self.check(1.)
+
+
+class JobQueue(object):
+    # background work keyed by a hashable key. get() and submit() mark a job
+    # as still wanted; an unfinished job nobody asked for within `idle`
+    # seconds is cancelled once another job of its group is asked for, so a
+    # moved slider drops stale work while other sessions polling their own
+    # jobs of the same group keep them
+    def __init__(self, workers=2, keep=256, idle=2.):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = {}
+        self.keep = keep
+        self.idle = idle
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is not None:
+                self._touch(job)
+            return job
+
+    def submit(self, key, func, group=None):
+        # func(job) runs on a worker thread; an unfinished job for key is
+        # returned as is
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is not None and job.active:
+                self._touch(job)
+                return job
+            job = self.jobs[key] = Job(key, group)
+            self._touch(job)
+            self._trim()
+        self.executor.submit(self._run, job, func)
+        return job
+
+    def _touch(self, job):
+        now = job.seen = time.monotonic()
+        if job.group is None:
+            return
+        for other in self.jobs.values():
+            if (other is not job and other.group == job.group and other.active
+                    and now-other.seen > self.idle):
+                other.cancel()
+
+    def _run(self, job, func):
+        try:
+            job.check()
+            job.status = 'running'
+            job.result = func(job)
+            job.progress = 1.
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            traceback.print_exc()
+            job.error = e
+            job.status = 'failed'
+
+    def _trim(self):
+        # forget the oldest finished jobs past `keep`; results live in the
+        # caches, not here
+        if len(self.jobs) <= self.keep:
+            return
+        for key in list(self.jobs):
+            if len(self.jobs) <= self.keep:
+                break
+            if not self.jobs[key].active:
+                del self.jobs[key]
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""Live signals: samples streamed over a socket or named pipe.
+
+    python live.py simulate input/sig_1.txt --address 127.0.0.1:5555 --rate 100000
+
+Samples are raw little-endian values of --dtype (int16 by default); the
+address is host:port for TCP or a path for a named pipe.
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+from dsp import BlockFilter, _avg_range, _trap_range, spectr_layout, time2spectr
+from loaders import parse_text
+
+
+READ_BYTES = 2**16
+
+
+#==================================
+#   buffers
+#==================================
+def live_layout(dtype, bins=None, lim=None):
+    # spectr layout fixed before any sample arrives: integers span their
+    # dtype (one bin per code up to 16 bit), floats need lim
+    dtype = np.dtype(dtype)
+    if lim is None:
+        if dtype.kind not in 'iu':
+            raise ValueError('live {} samples need a spectr lim'.format(dtype))
+        info = np.iinfo(dtype)
+        lim = (int(info.min), int(info.max)+1)
+    return spectr_layout(np.zeros(0, dtype), bins=bins, lim=lim)
+
+
+class RingBuffer(object):
+    # the newest `capacity` samples of a stream, addressed by absolute
+    # sample index; reset(total) drops the history and continues at total
+    def __init__(self, capacity, dtype=np.float64):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.first = 0
+        self.total = 0
+
+    @property
+    def capacity(self):
+        return len(self.data)
+
+    @property
+    def start(self):
+        return max(self.total-self.capacity, self.first)
+
+    def reset(self, total=0):
+        self.first = self.total = total
+
+    def write(self, block):
+        n = len(block)
+        block = block[-self.capacity:]
+        i = (self.total+n-len(block)) % self.capacity
+        first = min(len(block), self.capacity-i)
+        self.data[i:i+first] = block[:first]
+        self.data[:len(block)-first] = block[first:]
+        self.total += n
+
+    def read(self, start, end):
+        # samples [start, end) still held, clipped to what is held
+        start, end = max(start, self.start), min(end, self.total)
+        if end <= start:
+            return self.data[:0].copy()
+        i, j = start % self.capacity, end % self.capacity
+        if i < j:
+            return self.data[i:j].copy()
+        return np.concatenate([self.data[i:], self.data[:j]])
+
+
+class LiveSignal(object):
+    # ring buffers of the raw samples and their avg/trap outputs, and the
+    # running histogram of all samples; push() costs O(block) whatever the
+    # history. Changing L/G restarts the filters from the newest sample;
+    # the histogram layout is live_layout(dtype, bins, lim) unless given
+    def __init__(self, capacity, samplerate, dtype=np.int16, L=10, G=10, layout=None,
+                 bins=None, lim=None):
+        self.samplerate = samplerate
+        self.dtype = np.dtype(dtype)
+        self.raw = RingBuffer(capacity, self.dtype)
+        self.avg = RingBuffer(capacity)
+        self.trap = RingBuffer(capacity)
+        self.layout = live_layout(self.dtype, bins, lim) if layout is None else layout
+        self.counts = np.zeros(self.layout[2], dtype=np.int64)
+        self.lock = threading.Lock()
+        self.L, self.G = None, None
+        self.set_filter(L, G)
+
+    def set_filter(self, L, G):
+        with self.lock:
+            if (L, G) == (self.L, self.G):
+                return
+            self.L, self.G = L, G
+            # streams never end, so the prefix sums are rebased every block
+            self.filters = [BlockFilter(L, 0, _avg_range, rebase=True),
+                            BlockFilter(L, G, _trap_range, rebase=True)]
+            self.avg.reset(self.raw.total)
+            self.trap.reset(self.raw.total)
+
+    def push(self, block):
+        block = np.asarray(block, dtype=self.dtype)
+        with self.lock:
+            self.raw.write(block)
+            self.counts += time2spectr(block, layout=self.layout)
+            self.avg.write(self.filters[0].push(block))
+            self.trap.write(self.filters[1].push(block))
+
+    def spectr(self):
+        # (counts, total) of everything received
+        with self.lock:
+            return self.counts.copy(), self.raw.total
+
+    def snapshot(self, n):
+        # (start, raw, avg, trap, total) of the newest n filtered samples;
+        # the filter outputs lag the raw stream by L+G samples
+        with self.lock:
+            end = min(self.avg.total, self.trap.total)
+            start = max(end-n, self.raw.start, self.avg.start, self.trap.start)
+            return (start, self.raw.read(start, end), self.avg.read(start, end),
+                    self.trap.read(start, end), self.raw.total)
+
+
+#==================================
+#   ingest
+#==================================
+def read_stream(live, f, read_bytes=READ_BYTES):
+    # push the samples of a binary file object until it ends
+    itemsize = live.dtype.itemsize
+    rest = b''
+    while True:
+        chunk = f.read(read_bytes)
+        if not chunk:
+            return
+        chunk = rest+chunk
+        n = len(chunk)//itemsize*itemsize
+        rest = chunk[n:]
+        if n:
+            live.push(np.frombuffer(chunk[:n], dtype=live.dtype.newbyteorder('<')))
+
+
+def parse_address(address):
+    # (host, port) for 'host:port', None for a pipe path
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return None
+
+
+def serve(live, address):
+    # accept senders one after another, forever
+    tcp = parse_address(address)
+    if tcp is None:
+        if not os.path.exists(address):
+            os.mkfifo(address)
+        while True:
+            with open(address, 'rb') as f:
+                read_stream(live, f)
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(tcp)
+    server.listen(1)
+    while True:
+        conn, _ = server.accept()
+        with conn, conn.makefile('rb') as f:
+            read_stream(live, f)
+
+
+def start(live, address):
+    thread = threading.Thread(target=serve, args=(live, address), daemon=True)
+    thread.start()
+    return thread
+
+
+#==================================
+#   simulator
+#==================================
+def open_sink(address):
+    tcp = parse_address(address)
+    if tcp is None:
+        return open(address, 'wb')
+    conn = socket.create_connection(tcp)
+    return conn.makefile('wb')
+
+
+def simulate(path, address, rate, dtype=np.int16, block_ms=50, loop=True):
+    # replay a text signal at `rate` samples/s
+    with open(path, 'rb') as f:
+        data = parse_text(f).astype(np.dtype(dtype).newbyteorder('<'))
+    block = max(int(rate*block_ms/1000.), 1)
+    sink = open_sink(address)
+    t0, sent = time.perf_counter(), 0
+    try:
+        while True:
+            for i in range(0, len(data), block):
+                sink.write(data[i:i+block].tobytes())
+                sink.flush()
+                sent += len(data[i:i+block])
+                delay = t0+sent/float(rate)-time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if not loop:
+                return sent
+    finally:
+        sink.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command')
+    sim = commands.add_parser('simulate', help='replay a text signal')
+    sim.add_argument('path')
+    sim.add_argument('--address', default='127.0.0.1:5555', help='host:port or pipe path')
+    sim.add_argument('--rate', type=float, default=10**5, help='samples/s')
+    sim.add_argument('--dtype', default='int16')
+    sim.add_argument('--once', action='store_true', help='do not loop the file')
+    args = parser.parse_args(argv)
+    if args.command != 'simulate':
+        parser.error('nothing to do')
+    simulate(args.path, args.address, args.rate, args.dtype, loop=not args.once)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import io
+import os
+import re
+import struct
+import warnings
+
+import numpy as np
+from scipy.io import wavfile
+
+from metrics import METRICS
+from store import SignalStore
+
+
+TEXT_SAMPLERATE = 10**8
+CHUNK_BYTES = 2**24
+COMMENT_RE = re.compile(br'#[^\n]*')
+IS_SPACE = np.zeros(256, dtype=bool)
+IS_SPACE[np.frombuffer(b' \t\n\r\x0b\x0c', dtype=np.uint8)] = True
+
+
+#==================================
+#   wav signals
+#==================================
+def wav_info(path):
+    # (samplerate, frames, channels) from the RIFF header, no samples read
+    with open(path, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError('not a wav file: {}'.format(path))
+        fmt = None
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                raise ValueError('no data chunk in {}'.format(path))
+            chunk_id, size = struct.unpack('<4sI', head)
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', f.read(16))
+                f.seek(size-16+size % 2, 1)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError('no fmt chunk in {}'.format(path))
+                _, channels, samplerate, _, block_align, _ = fmt
+                return samplerate, size//block_align, channels
+            else:
+                f.seek(size+size % 2, 1)
+
+
+def load_wav(path):
+    # (samplerate, data, name) with data memory-mapped where scipy can
+    try:
+        samplerate, data = wavfile.read(path, mmap=True)
+    except ValueError:
+        # e.g. 24 bit samples have no numpy dtype to map onto
+        samplerate, data = wavfile.read(path)
+    return samplerate, data, os.path.basename(path)
+
+
+#==================================
+#   text signals
+#==================================
+def _compact(values):
+    # integral chunks are kept in the smallest of int16/int32/int64
+    if not len(values):
+        return values
+    ints = values.astype(np.int64)
+    if not np.array_equal(ints, values):
+        return values
+    lo, hi = ints.min(), ints.max()
+    for dtype in (np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return ints.astype(dtype)
+    return ints
+
+
+def _count_tokens(block):
+    # whitespace separated words in block, without splitting it
+    space = IS_SPACE[np.frombuffer(block, dtype=np.uint8)]
+    if not len(space):
+        return 0
+    return int(np.count_nonzero(~space[1:] & space[:-1])) + int(not space[0])
+
+
+def _parse_block(block, ncols):
+    if b'#' in block:
+        block = COMMENT_RE.sub(b'', block)
+    words = _count_tokens(block)
+    if not words:
+        # np.fromstring reads blank text as [-1]; int16 promotes to any chunk
+        return np.zeros((0, ncols) if ncols > 1 else 0, dtype=np.int16)
+    with warnings.catch_warnings():
+        # newer numpy reports unparsable text as a warning, older versions
+        # stop at the first bad word, caught by the word count below
+        warnings.simplefilter('error')
+        try:
+            values = np.fromstring(block, dtype=np.float64, sep=' ')
+        except (ValueError, DeprecationWarning) as e:
+            raise ValueError('bad text signal: {}'.format(e))
+    if len(values) != words:
+        raise ValueError('bad text signal: {} of {} values parsed'.format(len(values), words))
+    if len(values) % ncols:
+        raise ValueError('bad text signal: rows of unequal length')
+    values = _compact(values)
+    return values.reshape(-1, ncols) if ncols > 1 else values
+
+
+def _count_columns(block):
+    for line in COMMENT_RE.sub(b'', block).splitlines():
+        if line.strip():
+            return len(line.split())
+    return 1
+
+
+def iter_text_chunks(f, chunk_bytes=CHUNK_BYTES):
+    # parsed arrays of whole lines, about chunk_bytes of text each
+    rest = b''
+    ncols = None
+    while True:
+        block = f.read(chunk_bytes)
+        if not block:
+            break
+        block = rest+block
+        cut = block.rfind(b'\n')+1
+        rest = block[cut:]
+        if cut == 0:
+            continue
+        if ncols is None:
+            ncols = _count_columns(block[:cut])
+        yield _parse_block(block[:cut], ncols)
+    if rest.strip():
+        yield _parse_block(rest, ncols or _count_columns(rest))
+
+
+def _bytes_left(f):
+    # bytes from the current position to the end, None if f cannot seek
+    try:
+        pos = f.tell()
+        end = f.seek(0, 2)
+        f.seek(pos)
+    except (AttributeError, IOError, ValueError):
+        return None
+    return end-pos
+
+
+def _reserve(out, rows, dtype):
+    # out with the promoted dtype and room for `rows` rows; the resize is
+    # a realloc, so growing rarely copies
+    if out.dtype != dtype:
+        out = out.astype(dtype)
+    if rows != len(out):
+        out.resize((rows,)+out.shape[1:], refcheck=False)
+    return out
+
+
+def parse_text(f, chunk_bytes=CHUNK_BYTES):
+    # np.loadtxt replacement for numeric columns. Chunks are written into
+    # one array sized from the values per byte of the first chunk, so peak
+    # memory is about the compact result plus one chunk
+    left = _bytes_left(f)
+    start = f.tell() if left is not None else 0
+    out, n = None, 0
+    for chunk in iter_text_chunks(f, chunk_bytes):
+        m = len(chunk)
+        if out is None:
+            rows = m
+            read = f.tell()-start if left is not None else 0
+            if read and left > read:
+                rows += int(m*(left-read)/float(read)*1.05)+1
+            out = np.empty((rows,)+chunk.shape[1:], dtype=chunk.dtype)
+        else:
+            rows = len(out) if n+m <= len(out) else max(n+m, len(out)*3//2)
+            out = _reserve(out, rows, np.result_type(out.dtype, chunk.dtype))
+        out[n:n+m] = chunk
+        n += m
+    if out is None:
+        return np.zeros(0)
+    return _reserve(out, n, out.dtype)
+
+
+def file_hash(path, chunk_bytes=CHUNK_BYTES):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_bytes), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def store_text(path, store, samplerate=TEXT_SAMPLERATE, name=None, signal_id=None):
+    # parse a text file into store once, as a .npy sidecar under signal_id
+    # (its content hash by default); returns the id
+    signal_id = file_hash(path) if signal_id is None else signal_id
+    if not store.exists(signal_id):
+        with open(path, 'rb') as f:
+            data = parse_text(f)
+        name = os.path.basename(path) if name is None else name
+        store.put(signal_id, data, samplerate, name, fmt='txt')
+    return signal_id
+
+
+def load_text(path, samplerate=TEXT_SAMPLERATE, store=None):
+    # (samplerate, data, name); later loads of the same content are a
+    # memory-map of the sidecar
+    store = SignalStore() if store is None else store
+    _, data, _ = store.get(store_text(path, store, samplerate))
+    return samplerate, data, os.path.basename(path)
+
+
+#==================================
+#   dcc.Upload contents
+#==================================
+def parse_content_type(s):
+    s = s.split(';')[-2].split('-')[-1]
+    return s
+
+
+def decode_contents(contents):
+    # (format, file bytes) of a 'data:<type>;base64,<data>' string
+    content_type, content_string = contents.split(',')
+    return parse_content_type(content_type), base64.b64decode(content_string)
+
+
+def read_contents(decoded, content_format):
+    # (samplerate, data) of decoded file bytes
+    if content_format == 'wav':
+        return wavfile.read(io.BytesIO(decoded))
+    return TEXT_SAMPLERATE, parse_text(io.BytesIO(decoded))
+
+
+def parse_upload(contents):
+    # (samplerate, data) of a dcc.Upload contents string, decode and parse
+    # timed as separate stages
+    with METRICS.timed('decode') as info:
+        content_format, decoded = decode_contents(contents)
+        info['nbytes'] = len(decoded)
+    with METRICS.timed('parse', format=content_format) as info:
+        samplerate, data = read_contents(decoded, content_format)
+        info['samples'] = len(data)
+    return samplerate, data
+
+
+#==================================
+#   files
+#==================================
+def ingest_file(path, store, name=None, samplerate=None, signal_id=None):
+    # put a wav or text file into store under signal_id (its content hash
+    # by default), returns the id
+    name = os.path.basename(path) if name is None else name
+    if not name.lower().endswith('.wav'):
+        return store_text(path, store, samplerate or TEXT_SAMPLERATE, name, signal_id)
+    signal_id = file_hash(path) if signal_id is None else signal_id
+    if not store.exists(signal_id):
+        samplerate, data, _ = load_wav(path)
+        store.put(signal_id, data, samplerate, name, fmt='wav')
+    return signal_id
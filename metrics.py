@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import json
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger('levko_lab.metrics')
+
+
+class Metrics(object):
+    # per-stage call counts, seconds, input samples and output bytes,
+    # rendered in the Prometheus text format; set log=True to also write
+    # one JSON line per observation to the 'levko_lab.metrics' logger
+    def __init__(self, prefix='levko', log=False):
+        self.prefix = prefix
+        self.log = log
+        self.stages = {}
+        self.gauges = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds, samples=0, nbytes=0, **labels):
+        key = (stage, tuple(sorted(labels.items())))
+        with self.lock:
+            entry = self.stages.setdefault(key, [0, 0., 0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += int(samples)
+            entry[3] += int(nbytes)
+        if self.log:
+            record = dict(labels, stage=stage, seconds=round(seconds, 6),
+                          samples=int(samples), bytes=int(nbytes))
+            logger.info(json.dumps(record, sort_keys=True))
+
+    @contextlib.contextmanager
+    def timed(self, stage, samples=0, **labels):
+        # the yielded dict may set 'samples'/'nbytes' once they are known
+        info = {'samples': samples, 'nbytes': 0}
+        t0 = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.observe(stage, time.perf_counter()-t0,
+                         info['samples'], info['nbytes'], **labels)
+
+    def gauge(self, name, func, help=''):
+        # func() -> {labels tuple: value}, read on every render
+        self.gauges[name] = (func, help)
+
+    def counter(self, name, func, help=''):
+        # like gauge() for values that only grow; rendered as <name>_total
+        self.counters[name+'_total'] = (func, help)
+
+    def _labels(self, labels):
+        if not labels:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(k, str(v).replace('"', '\\"'))
+                              for k, v in labels) + '}'
+
+    def render(self):
+        p = self.prefix
+        lines = []
+        with self.lock:
+            stages = sorted(self.stages.items())
+        series = [
+            ('stage_seconds', 'summary', 'Time spent per stage.', None),
+            ('stage_samples_total', 'counter', 'Input samples per stage.', 2),
+            ('stage_bytes_total', 'counter', 'Output bytes per stage.', 3)
+        ]
+        for name, kind, help, col in series:
+            lines.append('# HELP {}_{} {}'.format(p, name, help))
+            lines.append('# TYPE {}_{} {}'.format(p, name, kind))
+            for (stage, labels), entry in stages:
+                tags = self._labels((('stage', stage),)+labels)
+                if col is None:
+                    lines.append('{}_{}_count{} {}'.format(p, name, tags, entry[0]))
+                    lines.append('{}_{}_sum{} {:.6f}'.format(p, name, tags, entry[1]))
+                else:
+                    lines.append('{}_{}{} {}'.format(p, name, tags, entry[col]))
+        read = [(name, kind, entry) for kind, entries in (('gauge', self.gauges),
+                                                          ('counter', self.counters))
+                for name, entry in entries.items()]
+        for name, kind, (func, help) in sorted(read):
+            lines.append('# HELP {}_{} {}'.format(p, name, help))
+            lines.append('# TYPE {}_{} {}'.format(p, name, kind))
+            for labels, value in sorted(func().items()):
+                lines.append('{}_{}{} {}'.format(p, name, self._labels(labels), value))
+        return '\n'.join(lines)+'\n'
+
+
+METRICS = Metrics()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dsp import _acc_dtype, _avg_range, _trap_range, prefix_sum, spectr_layout, time2spectr
+
+
+# numpy releases the GIL inside its array loops, so plain threads scale
+# over chunks without copying the signal into other processes
+WORKERS = int(os.environ.get('DSP_WORKERS', os.cpu_count() or 1))
+MIN_CHUNK = 2**18
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(workers=None):
+    workers = WORKERS if workers is None else max(int(workers), 1)
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = ThreadPoolExecutor(max_workers=workers)
+        return _executors[workers]
+
+
+def split(length, workers=None, min_chunk=MIN_CHUNK):
+    # [(lo, hi), ...] covering [0, length), at most one chunk per worker
+    workers = WORKERS if workers is None else max(int(workers), 1)
+    parts = max(min(workers, length//min_chunk), 1)
+    edges = np.linspace(0, length, parts+1).astype(np.int64)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def _map(func, chunks, workers=None):
+    if len(chunks) == 1:
+        return [func(*chunks[0])]
+    return list(get_executor(workers).map(lambda c: func(*c), chunks))
+
+
+def prefix_sum_parallel(arr, workers=None):
+    # integer sums are exact in any order, so the scan runs per chunk and
+    # the chunk offsets are added afterwards; floats stay sequential so the
+    # result matches prefix_sum bit for bit
+    arr = np.asarray(arr)
+    chunks = split(len(arr), workers)
+    if len(chunks) == 1 or arr.dtype.kind not in 'biu':
+        return prefix_sum(arr)
+    csum = np.zeros(len(arr)+1, dtype=_acc_dtype(arr))
+
+    def scan(lo, hi):
+        np.cumsum(arr[lo:hi], dtype=csum.dtype, out=csum[lo+1:hi+1])
+    _map(scan, chunks, workers)
+    offsets = np.cumsum([csum[hi] for _, hi in chunks[:-1]])
+
+    def shift(k):
+        lo, hi = chunks[k+1]
+        csum[lo+1:hi+1] += offsets[k]
+    _map(shift, [(k,) for k in range(len(chunks)-1)], workers)
+    return csum
+
+
+def _filter_parallel(arr, L, G, kernel, workers):
+    # every chunk [lo, hi) reads its L+G halo from the shared prefix sum
+    arr = np.asarray(arr)
+    csum = prefix_sum_parallel(arr, workers)
+    out = np.empty(len(arr), dtype=np.float64)
+
+    def run(lo, hi):
+        out[lo:hi] = kernel(arr, csum, L, G, lo, hi)
+    _map(run, split(len(arr), workers), workers)
+    return out
+
+
+def avg_filter_parallel(arr, L, G=0, workers=None):
+    return _filter_parallel(arr, L, G, _avg_range, workers)
+
+
+def trap_filter_parallel(arr, L, G=10, workers=None):
+    return _filter_parallel(arr, L, G, _trap_range, workers)
+
+
+def time2spectr_parallel(data, bins=None, lim=None, layout=None, workers=None):
+    # partial histograms per chunk, summed
+    data = np.asarray(data)
+    if layout is None:
+        layout = spectr_layout(data, bins=bins, lim=lim)
+    parts = _map(lambda lo, hi: time2spectr(data[lo:hi], layout=layout),
+                 split(len(data), workers), workers)
+    return np.sum(parts, axis=0)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from dsp import decimate, spectr_layout
+from parallel import time2spectr_parallel
+
+
+#==================================
+#   compact trace data
+#==================================
+def round_sig(arr, digits=7):
+    # round to `digits` significant digits of the largest magnitude (float32
+    # precision by default) so the JSON numbers stay short; integer arrays
+    # pass through and whole-valued results become integers
+    arr = np.asarray(arr)
+    if arr.dtype.kind in 'biu' or not arr.size:
+        return arr
+    finite = np.isfinite(arr)
+    if not finite.any():
+        return arr
+    top = np.abs(arr[finite]).max()
+    if top == 0:
+        return np.zeros(arr.shape, dtype=np.int64) if finite.all() else arr
+    decimals = int(digits-1-np.floor(np.log10(top)))
+    out = np.round(arr.astype(np.float64), decimals)
+    if decimals <= 0 and finite.all():
+        return out.astype(np.int64)
+    return out
+
+
+def round_time(x, samplerate):
+    # times rounded to the sample period, enough to tell samples apart
+    decimals = int(np.ceil(np.log10(max(samplerate, 1))))
+    return np.round(np.asarray(x, dtype=np.float64), decimals)
+
+
+def trim_zeros(counts):
+    # (start, stop) of the nonzero part of a histogram
+    nz = np.flatnonzero(counts)
+    if not len(nz):
+        return 0, 0
+    return int(nz[0]), int(nz[-1])+1
+
+
+#==================================
+#   figure traces
+#==================================
+def time_traces(ys, i0, smr, decim='minmax', lods=None, points=2000):
+    # x/y of each window in ys (all starting at sample i0): about `points`
+    # per trace, from a ready pyramid in O(points), else by decimating the
+    # window; full resolution with x implied by x0/dx once the window fits
+    if lods is None:
+        lods = [None]*len(ys)
+    traces = []
+    for y, lod in zip(ys, lods):
+        found = None
+        if lod is not None and decim is not None:
+            found = lod.query(i0, i0+len(y), points, mode=decim)
+        if found is not None:
+            trace = dict(x=round_time(found[0]/float(smr), smr), y=found[1])
+        elif decim is None or len(y) <= points:
+            trace = dict(x0=i0/float(smr), dx=1./smr, y=y)
+        else:
+            idx = decimate(y, points, mode=decim)
+            trace = dict(x=round_time((i0+idx)/float(smr), smr), y=y[idx])
+        trace['y'] = round_sig(trace['y'])
+        traces.append(trace)
+    return traces
+
+
+def window_traces(ys, i0, i1, smr, decim='minmax', lods=None, points=2000):
+    # time_traces of samples [i0, i1) of whole-signal arrays (raw and the
+    # cached filter outputs) and their pyramids
+    return time_traces([y[i0:i1] for y in ys], i0, smr, decim, lods, points)
+
+
+def window_spectr(arr, start=0, end=None, index=None):
+    # (spec, layout) of arr[start:end] from its SpectrIndex if there is one;
+    # the layout comes from the whole signal so the bins stay put on a pan
+    end = len(arr) if end is None else end
+    if index is not None:
+        return index.spectr(start, end), index.layout
+    layout = spectr_layout(arr)
+    return time2spectr_parallel(arr[int(start):int(end)], layout=layout), layout
+
+
+def spectr_trace(spec, layout):
+    # only the occupied bins, x implied by the first bin and the bin width
+    lo, step, _ = layout
+    start, stop = trim_zeros(spec)
+    return dict(x0=lo+start*step, dx=step, y=spec[start:stop])
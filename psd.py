@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from scipy.signal import get_window
+
+
+PSD_SEGMENTS = (256, 1024, 4096, 16384)
+BATCH_SAMPLES = 2**22
+
+
+def periodograms(data, nperseg, step, window, count):
+    # |rfft|^2 of `count` mean-removed, windowed segments data[k*step:][:nperseg],
+    # transformed together in batches of about BATCH_SAMPLES samples
+    out = np.empty((count, nperseg//2+1))
+    batch = max(BATCH_SAMPLES//nperseg, 1)
+    for b in range(0, count, batch):
+        n = min(batch, count-b)
+        part = np.ascontiguousarray(data[b*step:(b+n-1)*step+nperseg], dtype=np.float64)
+        segs = as_strided(part, shape=(n, nperseg),
+                          strides=(step*part.strides[0], part.strides[0]))
+        segs = (segs-segs.mean(axis=1, keepdims=True))*window
+        out[b:b+n] = np.abs(np.fft.rfft(segs, axis=1))**2
+    return out
+
+
+class WelchIndex(object):
+    # Welch PSD of any [start, end) of one signal from segments on a fixed
+    # grid (nperseg long, half overlapping). Periodogram sums are kept per
+    # chunk of `chunk` segments, so a panned window only transforms the
+    # chunks it has not covered before plus its partial edge chunks
+    def __init__(self, data, nperseg=4096, window='hann', chunk=64):
+        self.data = data
+        self.nperseg = int(nperseg)
+        self.step = self.nperseg//2 or 1
+        self.window = get_window(window, self.nperseg)
+        self.chunk = chunk
+        self.count = max((len(data)-self.nperseg)//self.step+1, 0)
+        self.chunks = {}
+        self.computed = 0
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.chunks.values())
+
+    def _sum(self, k0, k1):
+        # summed periodograms of segments [k0, k1)
+        self.computed += k1-k0
+        return periodograms(self.data[k0*self.step:], self.nperseg, self.step,
+                            self.window, k1-k0).sum(axis=0)
+
+    def segments(self, start, end):
+        # [k0, k1) of the segments inside [start, end)
+        k0 = -(-max(int(start), 0)//self.step)
+        k1 = min((int(end)-self.nperseg)//self.step+1, self.count)
+        return k0, max(k1, k0)
+
+    def psd(self, samplerate, start=0, end=None, job=None):
+        # (freqs, density, segments); density is None without a full segment
+        end = len(self.data) if end is None else end
+        k0, k1 = self.segments(start, end)
+        freqs = np.fft.rfftfreq(self.nperseg, 1./samplerate)
+        if k1 <= k0:
+            return freqs, None, 0
+        c0, c1 = -(-k0//self.chunk), k1//self.chunk
+        if c1 <= c0:
+            total = self._sum(k0, k1)
+        else:
+            total = self._sum(k0, c0*self.chunk) + self._sum(c1*self.chunk, k1)
+            for c in range(c0, c1):
+                if job is not None:
+                    job.check((c-c0)/float(c1-c0))
+                with self.lock:
+                    part = self.chunks.get(c)
+                if part is None:
+                    part = self._sum(c*self.chunk, (c+1)*self.chunk)
+                    with self.lock:
+                        self.chunks[c] = part
+                total = total + part
+        # one-sided power spectral density, as scipy.signal.welch
+        density = total/((k1-k0)*samplerate*(self.window**2).sum())
+        density[1:] *= 2
+        if self.nperseg % 2 == 0:
+            density[-1] /= 2
+        return freqs, density, k1-k0
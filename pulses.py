@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from dsp import iter_blocks, trap_filter_blocks, time2spectr
+
+
+PULSE_BINS = 2**12
+_NEVER = -2**62
+
+
+def noise_threshold(block, k=5.):
+    # k sigma of the trap output noise, sigma from the median absolute
+    # deviation so the pulses themselves barely move it
+    block = np.asarray(block, dtype=np.float64)
+    if not len(block):
+        return 0.
+    sigma = 1.4826*np.median(np.abs(block-np.median(block)))
+    if sigma == 0:
+        sigma = block.std()
+    return k*sigma
+
+
+def pulse_layout(data, bins=PULSE_BINS):
+    # trap output is a difference of two means of samples, so pulse heights
+    # lie within the peak-to-peak range of the signal
+    data = np.asarray(data)
+    top = float(data.max())-float(data.min()) if len(data) else 1.
+    top = top or 1.
+    step = top/bins
+    while step*bins < top:
+        step = float(np.nextafter(step, np.inf))
+    return 0., step, bins
+
+
+def _dead_time_mask(starts, last, dead_time):
+    # non-paralyzable: a trigger within dead_time of the last registered
+    # one is lost and does not extend the dead period
+    keep = np.ones(len(starts), dtype=bool)
+    if dead_time <= 0 or not len(starts):
+        return keep, starts[-1] if len(starts) else last
+    gaps = np.diff(np.concatenate([[last], starts]))
+    if (gaps >= dead_time).all():
+        return keep, starts[-1]
+    for k, s in enumerate(starts.tolist()):
+        if s-last < dead_time:
+            keep[k] = False
+        else:
+            last = s
+    return keep, last
+
+
+class PulseDetector(object):
+    # pulses in consecutive blocks of trap_filter output. A pulse is a run
+    # of samples at or above threshold, its height the flat-top maximum of
+    # the run. Triggers within dead_time of a registered one are lost;
+    # registered pulses with another trigger closer than pileup are
+    # rejected as piled up. Accepted heights go into the histogram `counts`.
+    def __init__(self, threshold, layout, dead_time=0, pileup=0):
+        self.threshold = threshold
+        self.layout = layout
+        self.dead_time = dead_time
+        self.pileup = pileup
+        self.counts = np.zeros(layout[2], dtype=np.int64)
+        self.position = 0
+        self.triggers = 0
+        self.dead = 0
+        self.piled_up = 0
+        self.registered = 0
+        self._starts = []
+        self._heights = []
+        self._above = False
+        self._open = None
+        self._last_start = _NEVER
+        self._last_registered = _NEVER
+        self._pending = None
+
+    @property
+    def starts(self):
+        return np.concatenate(self._starts) if self._starts else np.zeros(0, dtype=np.int64)
+
+    @property
+    def heights(self):
+        return np.concatenate(self._heights) if self._heights else np.zeros(0)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + sum(a.nbytes for a in self._starts+self._heights)
+
+    @property
+    def accepted(self):
+        return int(self.counts.sum())
+
+    @property
+    def live_time(self):
+        # samples not covered by a dead period
+        if not self.registered:
+            return self.position
+        last = min(self.dead_time, self.position-self._last_registered)
+        return self.position-(self.registered-1)*self.dead_time-max(last, 0)
+
+    def feed(self, block):
+        block = np.asarray(block)
+        n = len(block)
+        if not n:
+            return
+        above = block >= self.threshold
+        prev = np.empty(n, dtype=bool)
+        prev[0], prev[1:] = self._above, above[:-1]
+        rises = np.flatnonzero(above & ~prev)
+        falls = np.flatnonzero(~above & prev)
+        starts, heights = [], []
+        if self._open is not None:
+            if len(falls):
+                start, peak = self._open
+                if falls[0]:
+                    peak = max(peak, float(block[:falls[0]].max()))
+                starts.append([start])
+                heights.append([peak])
+                falls = falls[1:]
+                self._open = None
+            else:
+                self._open = (self._open[0], max(self._open[1], float(block.max())))
+        if len(rises) > len(falls):
+            self._open = (self.position+int(rises[-1]), float(block[rises[-1]:].max()))
+            rises = rises[:-1]
+        if len(rises):
+            bounds = np.empty(2*len(rises), dtype=np.intp)
+            bounds[0::2], bounds[1::2] = rises, falls
+            starts.append(self.position+rises)
+            heights.append(np.maximum.reduceat(block, bounds)[0::2])
+        self._above = bool(above[-1])
+        self.position += n
+        if starts:
+            self._register(np.concatenate(starts).astype(np.int64),
+                           np.concatenate(heights).astype(np.float64))
+
+    def _register(self, starts, heights):
+        self.triggers += len(starts)
+        registered, self._last_registered = _dead_time_mask(
+            starts, self._last_registered, self.dead_time)
+        self.dead += int((~registered).sum())
+        self.registered += int(registered.sum())
+        close = np.diff(np.concatenate([[self._last_start], starts])) < self.pileup
+        self._last_start = int(starts[-1])
+        if self._pending is not None:
+            start, height, was_registered, piled = self._pending
+            self._resolve(start, height, was_registered, piled or close[0])
+        # piled up with the previous or the next trigger; the last one waits
+        # for its successor
+        piled = close.copy()
+        piled[:-1] |= close[1:]
+        done = slice(0, len(starts)-1)
+        self._accept(starts[done], heights[done], registered[done], piled[done])
+        self._pending = (int(starts[-1]), float(heights[-1]), bool(registered[-1]), bool(close[-1]))
+
+    def _resolve(self, start, height, registered, piled):
+        self._accept(np.array([start]), np.array([height]),
+                     np.array([registered]), np.array([piled]))
+        self._pending = None
+
+    def _accept(self, starts, heights, registered, piled):
+        self.piled_up += int((registered & piled).sum())
+        ok = registered & ~piled
+        if ok.any():
+            self._starts.append(starts[ok])
+            self._heights.append(heights[ok])
+            self.counts += time2spectr(heights[ok], layout=self.layout)
+
+    def finish(self):
+        # the last trigger has no successor; a pulse still open at the end
+        # is cut off and dropped
+        if self._pending is not None:
+            self._resolve(*self._pending)
+        self._open = None
+        return self
+
+    def spectr(self, start=0, end=None):
+        # pulse-height histogram of the pulses starting in [start, end)
+        end = self.position if end is None else end
+        a, b = np.searchsorted(self.starts, [start, end])
+        return time2spectr(self.heights[a:b], layout=self.layout)
+
+
+def detect_pulses(data, L, G=10, threshold=None, dead_time=None, pileup=None,
+                  bins=PULSE_BINS, job=None):
+    # PulseDetector run over trap_filter output of data, block by block.
+    # The last L+G samples, where the filter has no full window, are skipped;
+    # threshold defaults to noise_threshold of the first block, dead time
+    # and pile-up window to the filter length L+G
+    data = np.asarray(data)
+    valid = max(len(data)-L-G, 0)
+    blocks = iter_blocks(data)
+    if job is not None:
+        blocks = job.track(blocks, len(data))
+    detector = None
+    seen = 0
+    for block in trap_filter_blocks(blocks, L, G):
+        block = block[:max(valid-seen, 0)]
+        seen += len(block)
+        if detector is None:
+            detector = PulseDetector(
+                noise_threshold(block) if threshold is None else threshold,
+                pulse_layout(data, bins),
+                L+G if dead_time is None else dead_time,
+                L+G if pileup is None else pileup
+            )
+        detector.feed(block)
+    if detector is None:
+        detector = PulseDetector(threshold or 0., pulse_layout(data, bins))
+    return detector.finish()
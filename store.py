@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+
+DEFAULT_ROOT = os.path.join(tempfile.gettempdir(), 'levko_lab_signals')
+ID_RE = re.compile(r'^[0-9a-zA-Z_-]{1,64}$')
+
+
+class SignalStore(object):
+    # signals saved once as <id>.npy + <id>.json under root and opened
+    # memory-mapped, so every worker process shares the same page cache.
+    # Outputs computed from a signal go into a separate `derived` store with
+    # its own byte cap, tagged with their source and removed along with it
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=None, derived=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.derived = derived
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def _path(self, signal_id, ext):
+        if not ID_RE.match(str(signal_id)):
+            raise ValueError('bad signal id: {!r}'.format(signal_id))
+        return os.path.join(self.root, '{}.{}'.format(signal_id, ext))
+
+    def _replace(self, path, write):
+        # write to a temp file and rename, readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def exists(self, signal_id):
+        try:
+            return os.path.exists(self._path(signal_id, 'json'))
+        except ValueError:
+            return False
+
+    def put(self, signal_id, data, samplerate, name='', fmt=None, source=None):
+        data = np.asarray(data)
+        self._replace(self._path(signal_id, 'npy'),
+                      lambda f: np.save(f, data, allow_pickle=False))
+        meta = {
+            'samplerate': int(samplerate),
+            'name': name,
+            'format': fmt,
+            'dtype': data.dtype.str,
+            'length': len(data),
+            'source': source
+        }
+        self._replace(self._path(signal_id, 'json'),
+                      lambda f: f.write(json.dumps(meta).encode('utf-8')))
+        if self.max_bytes is not None:
+            self.prune(self.max_bytes, keep=signal_id)
+        return signal_id
+
+    def put_blocks(self, signal_id, blocks, length, dtype, samplerate, name='', fmt=None,
+                   source=None):
+        # like put() for data arriving as a stream of blocks (e.g. the
+        # output of dsp.trap_filter_blocks); only one block is in memory
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        os.close(fd)
+        try:
+            out = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=(length,))
+            pos = 0
+            for block in blocks:
+                out[pos:pos+len(block)] = block
+                pos += len(block)
+            out.flush()
+            del out
+            os.replace(tmp, self._path(signal_id, 'npy'))
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        meta = {
+            'samplerate': int(samplerate),
+            'name': name,
+            'format': fmt,
+            'dtype': np.dtype(dtype).str,
+            'length': length,
+            'source': source
+        }
+        self._replace(self._path(signal_id, 'json'),
+                      lambda f: f.write(json.dumps(meta).encode('utf-8')))
+        if self.max_bytes is not None:
+            self.prune(self.max_bytes, keep=signal_id)
+        return signal_id
+
+    def meta(self, signal_id):
+        with open(self._path(signal_id, 'json')) as f:
+            return json.load(f)
+
+    def get(self, signal_id):
+        # (samplerate, data, name) with data as a read-only memmap
+        meta = self.meta(signal_id)
+        data = np.load(self._path(signal_id, 'npy'), mmap_mode='r')
+        return meta['samplerate'], data, meta['name']
+
+    def remove(self, signal_id):
+        for ext in ('json', 'npy'):
+            path = self._path(signal_id, ext)
+            if os.path.exists(path):
+                os.remove(path)
+        if self.derived is not None:
+            self.derived.remove_source(signal_id)
+
+    def remove_source(self, source):
+        # every signal derived from `source`
+        for fname in os.listdir(self.root):
+            if not fname.endswith('.json'):
+                continue
+            try:
+                meta = self.meta(fname[:-5])
+            except (IOError, ValueError):
+                continue
+            if meta.get('source') == source:
+                self.remove(fname[:-5])
+
+    def prune(self, max_bytes, keep=None):
+        # drop the least recently written signals until the store fits
+        entries = []
+        for fname in os.listdir(self.root):
+            if fname.endswith('.npy'):
+                st = os.stat(os.path.join(self.root, fname))
+                entries.append((st.st_mtime, st.st_size, fname[:-4]))
+        total = sum(e[1] for e in entries)
+        for _, size, signal_id in sorted(entries):
+            if total <= max_bytes:
+                break
+            if signal_id != keep:
+                self.remove(signal_id)
+                total -= size
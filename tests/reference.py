@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+#==================================
+#   reference implementations
+#==================================
+def ref_avg_filter(arr, L, G=0):
+    length = len(arr)
+    filt_arr = [a for a in arr]
+    for i in range(length-L-G):
+        for j in range(L-1):
+            filt_arr[i] += arr[i+G+j+1]
+        filt_arr[i] /= L
+    for i in range(length-L-G, L+G):
+        filt_arr[i] = 0
+    return np.array(filt_arr)
+
+
+def ref_trap_filter(arr, L, G=10):
+    return ref_avg_filter(arr, L, G=G) - ref_avg_filter(arr, L, G=0)
+
+
+def ref_time2spectr(data):
+    lim = 65536
+    spec = [0 for i in range(lim)]
+    # python scalars keep numpy 1.x promotion (int16 + 32768 -> int32)
+    for a in np.asarray(data).tolist():
+        a += 32768
+        if a < lim:
+            spec[int(a)] += 1
+    return spec
+
+
+def ref_pulses(trap, threshold, dead_time, pileup):
+    # runs at or above threshold ended inside trap, as (start, max); dead
+    # time counted from registered triggers, pile-up against any trigger
+    runs = []
+    i = 0
+    while i < len(trap):
+        if trap[i] < threshold:
+            i += 1
+            continue
+        j = i
+        while j < len(trap) and trap[j] >= threshold:
+            j += 1
+        if j < len(trap):
+            runs.append((i, trap[i:j].max()))
+        i = j
+    starts = [s for s, _ in runs]
+    accepted, last = [], None
+    for k, (s, h) in enumerate(runs):
+        if last is not None and s-last < dead_time:
+            continue
+        last = s
+        if k > 0 and s-starts[k-1] < pileup:
+            continue
+        if k+1 < len(starts) and starts[k+1]-s < pileup:
+            continue
+        accepted.append((s, h))
+    return accepted
+
+
+#==================================
+#   helpers
+#==================================
+def make_pulses(n, count, seed=0):
+    # noise plus exponentially decaying steps, detector-like
+    rnd = np.random.RandomState(seed)
+    data = rnd.normal(0, 5, n)
+    decay = np.exp(-np.arange(4000)/1000.)
+    for p, a in zip(rnd.randint(0, n-200, count), rnd.uniform(50, 500, count)):
+        tail = min(len(decay), n-p)
+        data[p:p+tail] += a*decay[:tail]
+    return data
+
+
+def make_signal(n, dtype=np.int16, seed=0):
+    rnd = np.random.RandomState(seed)
+    data = rnd.normal(0, 400, n)
+    if np.dtype(dtype).kind == 'f':
+        return data.astype(dtype)
+    return np.clip(data, -2**15, 2**15-1).astype(dtype)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+
+import batch
+
+
+def test_same_names(tmp_path):
+    # a/x.txt and b/x.txt go to out/a/ and out/b/
+    for sub, values in (('a', [1, 2, 3, 4]), ('b', [5, 6, 7, 8])):
+        os.makedirs(str(tmp_path/'in'/sub))
+        with open(str(tmp_path/'in'/sub/'x.txt'), 'w') as f:
+            f.write('\n'.join(map(str, values))+'\n')
+    out = str(tmp_path/'out')
+    paths = batch.find_files([str(tmp_path/'in'/'*'/'x.txt'), str(tmp_path/'in'/'a'/'x.txt')])
+    assert len(paths) == 2
+    rows = list(batch.run(paths, out, 1, 0, workers=1))
+    assert not any(row.get('error') for row in rows)
+    assert sorted(os.path.relpath(row['output'], out) for row in rows) == [
+        os.path.join('a', 'x.txt.npz'), os.path.join('b', 'x.txt.npz')]
+    with np.load(os.path.join(out, 'b', 'x.txt.npz')) as f:
+        assert np.array_equal(f['trap'], batch.trap_filter(np.array([5, 6, 7, 8]), 1, 0))
+    assert batch.output_names(['x.txt']) == ['x.txt']
+
+
+def test_text_sidecar(tmp_path):
+    # a second run maps the sidecar parsed by the first
+    with open(str(tmp_path/'x.txt'), 'w') as f:
+        f.write('1\n2\n3\n4\n')
+    store = batch.SignalStore(str(tmp_path/'store'))
+    for _ in range(2):
+        samplerate, data = batch.load_file(str(tmp_path/'x.txt'), 100, store)
+        assert samplerate == 100 and np.array_equal(data, [1, 2, 3, 4])
+    assert isinstance(data, np.memmap) and len(os.listdir(store.root)) == 2
+    rows = list(batch.run([str(tmp_path/'x.txt')], str(tmp_path/'out'), 1, 0, store=store))
+    assert not rows[0].get('error')
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from cache import LRUCache
+
+
+def test_lru_bytes():
+    cache = LRUCache(3*800)
+    for k in range(5):
+        cache.put(k, np.zeros(100))
+    assert list(cache.items) == [2, 3, 4] and cache.nbytes == 2400
+    assert cache.get(2) is not None and cache.get(0) is None
+    cache.put(5, np.zeros(100))
+    assert list(cache.items) == [4, 2, 5]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    cache.put(6, np.zeros(1000))
+    assert 6 not in cache
+
+
+def test_lru_memmap_entries(tmp_path):
+    # memmaps count 0 bytes; max_entries still evicts them
+    path = str(tmp_path/'x.npy')
+    np.save(path, np.zeros(1000))
+    cache = LRUCache(2**30, max_entries=2)
+    for k in range(4):
+        cache.put(k, np.load(path, mmap_mode='r'))
+    assert list(cache.items) == [2, 3] and cache.nbytes == 0
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+import dsp
+from tests.reference import make_signal, ref_avg_filter, ref_time2spectr, ref_trap_filter
+
+
+def test_avg_filter():
+    # int16 sums are kept small so the reference does not overflow
+    for dtype in (np.int16, np.float64):
+        arr = make_signal(3000, dtype)
+        if dtype is np.int16:
+            arr = (arr // 64).astype(np.int16)
+        for L in (1, 2, 10, 100):
+            for G in (0, 1, 10, 25):
+                exp = ref_avg_filter(arr, L, G)
+                got = dsp.avg_filter(arr, L, G)
+                assert np.allclose(got, exp, rtol=0, atol=1e-9), (dtype, L, G)
+                exp = ref_trap_filter(arr, L, G)
+                got = dsp.trap_filter(arr, L, G)
+                assert np.allclose(got, exp, rtol=0, atol=1e-9), (dtype, L, G)
+
+
+def test_avg_filter_short():
+    # L+G >= N is all zeros
+    arr = make_signal(60)
+    assert not dsp.avg_filter(arr, 40, 20).any()
+    assert np.allclose(dsp.avg_filter(arr, 40, 10), ref_avg_filter(arr, 40, 10))
+
+
+def test_trap_filter_multi():
+    arr = make_signal(3000)
+    L = np.array([1, 10, 50, 100])
+    G = np.array([[0], [5], [20]])
+    got = dsp.trap_filter_multi(arr, L, G)
+    pairs = np.broadcast_arrays(L, G)
+    exp = [dsp.trap_filter(arr, int(l), int(g))
+           for l, g in zip(pairs[0].ravel(), pairs[1].ravel())]
+    assert got.shape == (12, len(arr))
+    assert np.allclose(got, exp, rtol=0, atol=1e-9)
+
+
+def test_filter_blocks():
+    for dtype in (np.int16, np.float64):
+        arr = make_signal(100003, dtype)
+        for L, G in ((10, 5), (100, 100), (37, 0)):
+            for block_size in (7, 4096, 10**6):
+                blocks = dsp.iter_blocks(arr, block_size)
+                got = np.concatenate(list(dsp.avg_filter_blocks(blocks, L, G)))
+                assert np.array_equal(got, dsp.avg_filter(arr, L, G))
+                blocks = dsp.iter_blocks(arr, block_size)
+                got = np.concatenate(list(dsp.trap_filter_blocks(blocks, L, G)))
+                assert np.array_equal(got, dsp.trap_filter(arr, L, G))
+
+
+def test_block_filter_rebase():
+    # integer prefix sums cover only the halo, however long the stream,
+    # and stay exact
+    f = dsp.BlockFilter(10, 20, dsp._trap_range)
+    out = [f.push(np.full(1000, 10**6+k, dtype=np.int64)) for k in range(1000)]
+    assert len(f.csum) == 31 and abs(f.csum).max() <= 31*(10**6+999)
+    out = np.concatenate(out+[f.flush()])
+    arr = np.repeat(10**6+np.arange(1000, dtype=np.int64), 1000)
+    assert np.array_equal(out, dsp.trap_filter(arr, 10, 20))
+    # float ones only on request; on a large offset they keep the precision
+    # the whole-array prefix sum loses (trap output ignores the offset)
+    arr = make_signal(100003, np.float64) + 10**6
+    f = dsp.BlockFilter(10, 20, dsp._trap_range, rebase=True)
+    out = [f.push(b) for b in dsp.iter_blocks(arr, 1000)]
+    assert len(f.csum) == 31 and abs(f.csum).max() < 31*2*10**6
+    out = np.concatenate(out+[f.flush()])
+    exp = dsp.trap_filter(arr-10**6, 10, 20)
+    assert np.allclose(out, exp, rtol=0, atol=1e-6)
+
+
+def test_trap_filter_range():
+    # ranges read their own halo; exact for integer samples
+    for dtype in (np.int16, np.float64):
+        arr = make_signal(100003, dtype)
+        for L, G in ((10, 5), (100, 100), (37, 0)):
+            for block_size in (7, 4096, 10**6):
+                for start, end in ((0, None), (1234, 99990), (99000, 100003)):
+                    exp = dsp.trap_filter(arr, L, G)[start:end]
+                    got = np.concatenate(list(dsp.trap_filter_range(arr, L, G, start, end, block_size)))
+                    assert np.allclose(got, exp, rtol=0, atol=1e-9), (L, G, start, end)
+                    assert dtype is not np.int16 or np.array_equal(got, exp)
+
+
+def test_avg_filter_range():
+    # ranges starting and ending on, just before and just after block
+    # edges, and across the N-L-G tail where the output switches to zeros
+    # and raw samples
+    for dtype in (np.int16, np.float64):
+        arr = make_signal(10007, dtype)
+        for L, G in ((10, 5), (100, 100), (37, 0), (1, 0)):
+            exp = dsp.avg_filter(arr, L, G)
+            tail = len(arr)-L-G
+            for block_size in (7, 1000, 4096):
+                edges = (0, 1, block_size-1, block_size, block_size+1, 3*block_size,
+                         tail-1, tail, tail+1, len(arr)-1)
+                for start in (e for e in edges if e < len(arr)):
+                    for end in (start+1, start+block_size, start+block_size+1, None):
+                        blocks = list(dsp.avg_filter_range(arr, L, G, start, end, block_size))
+                        assert all(len(b) <= block_size for b in blocks)
+                        got = np.concatenate(blocks)
+                        assert np.allclose(got, exp[start:end], rtol=0, atol=1e-9), (L, G, start, end)
+                        assert dtype is not np.int16 or np.array_equal(got, exp[start:end])
+
+
+def test_time2spectr():
+    arr = make_signal(10**5)
+    assert np.array_equal(dsp.time2spectr(arr), ref_time2spectr(arr))
+    arr = arr.astype(np.float64)
+    layout = (-2**15, 1, 2**16)
+    assert np.array_equal(dsp.time2spectr(arr, layout=layout), ref_time2spectr(arr))
+
+
+def test_time2spectr_wide():
+    # wide dtypes are binned over their own range instead of being clipped
+    arr = make_signal(10**4, np.int32) * 2**16
+    assert dsp.time2spectr(arr).sum() == len(arr)
+    arr = make_signal(10**4, np.float32) / 2**15
+    assert dsp.time2spectr(arr, bins=100).sum() == len(arr)
+
+
+def test_time2spectr_int32_full_range():
+    rnd = np.random.RandomState(0)
+    arr = rnd.randint(-2**31, 2**31, 10**4).astype(np.int32)
+    arr[:3] = -2**31, 0, 2**31-1
+    lo, step, nbins = layout = dsp.spectr_layout(arr)
+    exp = np.zeros(nbins, dtype=np.int64)
+    for a in arr.tolist():
+        exp[min(int((a-lo)/step), nbins-1)] += 1
+    assert np.array_equal(dsp.time2spectr(arr), exp)
+    assert np.array_equal(dsp.time2spectr(arr, layout=layout), exp)
+
+
+def test_spectr_index():
+    arr = make_signal(10**6)
+    index = dsp.SpectrIndex(arr, block_size=4096)
+    for start, end in ((0, len(arr)), (12345, 765432), (100, 200), (4000, 8200)):
+        exp = dsp.time2spectr(arr[start:end], layout=index.layout)
+        assert np.array_equal(index.spectr(start, end), exp), (start, end)
+    index = dsp.SpectrIndex(arr.astype(np.float64)/7, max_bytes=2**20)
+    assert index.nbytes <= 2**20
+    assert index.spectr().sum() == len(arr)
+
+
+def test_decimate():
+    arr = make_signal(10**6, np.float64)
+    arr[654321] = 10**5
+    for mode in ('minmax', 'lttb'):
+        idx = dsp.decimate(arr, 2000, mode=mode)
+        assert len(idx) <= 2000 and np.all(np.diff(idx) > 0), mode
+        assert 654321 in idx, mode
+    assert np.array_equal(dsp.decimate(arr[:1500], 2000), np.arange(1500))
+
+
+def test_lod_pyramid():
+    arr = make_signal(10**6, np.float64)
+    arr[654321] = 10**5
+    lod = dsp.LODPyramid(arr)
+    assert lod.nbytes <= 1.6*len(arr)
+    pos, val = lod.query(0, len(arr), 2000)
+    assert len(val) <= 2000 and val.max() == 10**5 and val.min() == np.float32(arr.min())
+    pos, val = lod.query(0, len(arr), 2000, mode='lttb')
+    assert len(val) <= 2000 and np.all(np.diff(pos) >= 0)
+    assert val.max() == 10**5 and abs(pos[val.argmax()]-654321) < lod.factor(lod.select(0, len(arr), 2000))
+    pos, val = lod.query(600000, 700000, 500, mode='lttb')
+    assert val.max() == 10**5
+    assert lod.query(0, 5000, 2000) is None
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import io
+
+import numpy as np
+
+import export
+
+
+def encode(blocks, fmt, length, dtype, **kwargs):
+    return b''.join(export.encode_blocks(iter(blocks), fmt, length, dtype, **kwargs))
+
+
+def test_binary_lengths():
+    # Content-Length is sent before streaming, so it must match exactly
+    data = np.linspace(-40000, 40000, 1001)
+    blocks = np.array_split(data, 7)
+    for dtype in (np.int16, np.float64, np.dtype('>f4')):
+        for fmt in ('npy', 'int16', 'float32'):
+            body = encode([b.astype(dtype) for b in blocks], fmt, len(data), dtype)
+            assert len(body) == export.content_length(fmt, len(data), dtype), (fmt, dtype)
+    assert export.content_length('csv', len(data), np.float64) is None
+
+
+def test_npy():
+    data = np.arange(1000, dtype='>i4')
+    body = encode(np.array_split(data, 3), 'npy', len(data), data.dtype)
+    got = np.load(io.BytesIO(body))
+    assert got.dtype == np.dtype('<i4') and np.array_equal(got, data)
+
+
+def test_raw():
+    data = np.array([-1e6, -32768.6, -1.5, 0.4, 2.5, 32767.4, 1e6])
+    got = np.frombuffer(encode([data], 'int16', len(data), data.dtype), dtype='<i2')
+    # rounded half to even, then clipped to the int16 range
+    assert got.tolist() == [-32768, -32768, -2, 0, 2, 32767, 32767]
+    got = np.frombuffer(encode([data], 'float32', len(data), data.dtype), dtype='<f4')
+    assert np.array_equal(got, data.astype(np.float32))
+    ints = np.array([-5, 7], dtype=np.int64)
+    assert export._convert(ints, np.dtype('<i2')) == ints.astype('<i2').tobytes()
+
+
+def test_csv():
+    body = encode([np.array([1., 2.]), np.array([3.5])], 'csv', 3, np.float64,
+                  columns=('time', 'avg'), x0=0.5, dx=0.25).decode()
+    lines = body.splitlines()
+    assert lines[0] == 'time,avg'
+    assert lines[1:] == ['0.5,1', '0.75,2', '1,3.5']
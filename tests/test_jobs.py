@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from jobs import JobQueue
+
+
+def wait(job, timeout=5.):
+    t0 = time.monotonic()
+    while job.active and time.monotonic()-t0 < timeout:
+        time.sleep(0.005)
+    return job.status
+
+
+def blocking(started, release):
+    # a job that runs until release is set, stopping early when cancelled
+    def run(job):
+        started.set()
+        while not release.wait(0.005):
+            job.check()
+        return job.key
+    return run
+
+
+def test_done_and_failed():
+    queue = JobQueue(workers=1)
+    job = queue.submit('a', lambda job: 42)
+    assert wait(job) == 'done' and job.result == 42 and job.progress == 1.
+
+    def fail(job):
+        raise ValueError('bad')
+    job = queue.submit('b', fail)
+    assert wait(job) == 'failed' and isinstance(job.error, ValueError)
+    # a failed job is kept until resubmitted
+    assert queue.get('b') is job
+    assert wait(queue.submit('b', lambda job: 1)) == 'done'
+
+
+def test_group_cancels_idle_jobs():
+    # a moved slider: the job nobody polls any more is cancelled when
+    # another job of its group is asked for
+    queue = JobQueue(workers=2, idle=0.05)
+    started, release = threading.Event(), threading.Event()
+    old = queue.submit(('filter', 10), blocking(started, release), group='filter')
+    try:
+        assert started.wait(5.)
+        time.sleep(0.1)
+        new = queue.submit(('filter', 20), lambda job: 20, group='filter')
+        assert wait(old) == 'cancelled' and wait(new) == 'done'
+    finally:
+        release.set()
+
+
+def test_group_keeps_polled_jobs():
+    # two sessions polling different jobs of one group do not cancel each
+    # other, however often they resubmit
+    queue = JobQueue(workers=2, idle=0.2)
+    started, release = threading.Event(), threading.Event()
+    first = queue.submit(('filter', 10), blocking(started, release), group='filter')
+    second = queue.submit(('filter', 20), blocking(threading.Event(), release), group='filter')
+    try:
+        for _ in range(20):
+            assert queue.submit(('filter', 10), None, group='filter') is first
+            assert queue.submit(('filter', 20), None, group='filter') is second
+            time.sleep(0.02)
+    finally:
+        release.set()
+    assert wait(first) == 'done' and wait(second) == 'done'
+
+
+def test_trim():
+    # only finished jobs are forgotten, oldest first
+    queue = JobQueue(workers=2, keep=3)
+    started, release = threading.Event(), threading.Event()
+    running = queue.submit('running', blocking(started, release))
+    try:
+        assert started.wait(5.)
+        for k in range(4):
+            assert wait(queue.submit(k, lambda job: None)) == 'done'
+        assert list(queue.jobs) == ['running', 2, 3]
+    finally:
+        release.set()
+    assert wait(running) == 'done'
+    wait(queue.submit(4, lambda job: None))
+    assert list(queue.jobs) == [2, 3, 4]
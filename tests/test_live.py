@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import dsp
+import live
+from tests.reference import make_signal
+
+
+def test_live_signal():
+    arr = make_signal(300000)
+    signal = live.LiveSignal(2**16, 44100, L=10, G=20)
+    for block in np.array_split(arr, 997):
+        signal.push(block)
+    start, raw, avg, trap, total = signal.snapshot(50000)
+    end = start+len(trap)
+    assert total == len(arr) and end == len(arr)-30 and len(raw) == 50000
+    assert np.array_equal(raw, arr[start:end])
+    assert np.array_equal(avg, dsp.avg_filter(arr, 10)[start:end])
+    assert np.array_equal(trap, dsp.trap_filter(arr, 10, 20)[start:end])
+    assert np.array_equal(signal.spectr()[0], dsp.time2spectr(arr))
+
+
+def test_live_signal_dtypes():
+    # the spectr covers every sample whatever the dtype
+    arr = make_signal(100000, np.int32) * 2**16
+    signal = live.LiveSignal(2**14, 44100, dtype=np.int32, L=10, G=20)
+    for block in np.array_split(arr, 97):
+        signal.push(block)
+    counts, total = signal.spectr()
+    assert counts.sum() == total == len(arr)
+    assert np.array_equal(counts, dsp.time2spectr(arr, layout=signal.layout))
+    arr = make_signal(100000, np.float32) / 2**15
+    signal = live.LiveSignal(2**14, 44100, dtype=np.float32, lim=(-1, 1), bins=1000)
+    for block in np.array_split(arr, 97):
+        signal.push(block)
+    assert signal.spectr()[0].sum() == len(arr) and len(signal.spectr()[0]) == 1000
+    with pytest.raises(ValueError):
+        live.LiveSignal(2**14, 44100, dtype=np.float32)
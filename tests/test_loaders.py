@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+
+import numpy as np
+import pytest
+
+import loaders
+from store import SignalStore
+
+
+INPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'input')
+
+
+def test_parse_text():
+    for name in ('sig_1.txt', 'sig_2.txt'):
+        path = os.path.join(INPUT, name)
+        with open(path, 'rb') as f:
+            data = loaders.parse_text(f, chunk_bytes=4096)
+        assert np.array_equal(data, np.loadtxt(path)), path
+
+
+def test_parse_text_growing():
+    # chunks promote int16 -> int32 -> float64, with and without a size
+    # estimate from seek/tell
+    values = [1, -2, 3]*500 + [70000]*300 + [0.5]*200
+    text = ''.join('{}\n'.format(v) for v in values).encode()
+    exp = np.array(values, dtype=np.float64)
+
+    class Stream(object):
+        def __init__(self, data):
+            self.read = io.BytesIO(data).read
+
+    for f in (io.BytesIO(text), Stream(text)):
+        data = loaders.parse_text(f, chunk_bytes=64)
+        assert data.dtype == np.float64 and np.array_equal(data, exp)
+    data = loaders.parse_text(io.BytesIO(b'1 2\n3 4\n5 6\n'), chunk_bytes=4)
+    assert data.dtype == np.int16 and np.array_equal(data, [[1, 2], [3, 4], [5, 6]])
+
+
+def test_parse_text_bad():
+    # the word count catches what np.fromstring silently drops
+    assert loaders._count_tokens(b' 1 2\n3\t4 ') == 4
+    assert loaders._count_tokens(b'') == loaders._count_tokens(b' \n') == 0
+    for text in (b'1\n2\nx\n4\n', b'1 2\n3 4 5\n', b'1,2\n'):
+        with pytest.raises(ValueError, match='bad text signal'):
+            loaders.parse_text(io.BytesIO(text), chunk_bytes=4)
+    assert len(loaders.parse_text(io.BytesIO(b'# comment only\n\n'))) == 0
+
+
+def test_load_text_sidecar(tmp_path, monkeypatch):
+    # parsed once; later loads, and ingest_file of the same content, map
+    # the stored .npy
+    path = str(tmp_path/'sig.txt')
+    with open(path, 'w') as f:
+        f.write('1\n-2\n3\n')
+    store = SignalStore(str(tmp_path/'store'))
+    samplerate, data, name = loaders.load_text(path, 1000, store)
+    assert samplerate == 1000 and name == 'sig.txt' and np.array_equal(data, [1, -2, 3])
+
+    def parse_text(f, chunk_bytes=None):
+        raise AssertionError('parsed twice')
+    monkeypatch.setattr(loaders, 'parse_text', parse_text)
+    samplerate, data, name = loaders.load_text(path, 2000, store)
+    assert isinstance(data, np.memmap) and samplerate == 2000
+    assert loaders.ingest_file(path, store) == loaders.file_hash(path)
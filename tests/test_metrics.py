@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from metrics import Metrics
+
+
+def test_render():
+    metrics = Metrics(prefix='t')
+    with metrics.timed('filter', samples=100, kind='avg') as info:
+        info['nbytes'] = 800
+    metrics.gauge('items', lambda: {(('cache', 'lod'),): 3}, 'Entries.')
+    metrics.counter('hits', lambda: {(('cache', 'lod'),): 7}, 'Hits.')
+    lines = metrics.render().splitlines()
+    assert 't_stage_seconds_count{stage="filter",kind="avg"} 1' in lines
+    assert 't_stage_samples_total{stage="filter",kind="avg"} 100' in lines
+    assert 't_stage_bytes_total{stage="filter",kind="avg"} 800' in lines
+    assert '# TYPE t_items gauge' in lines and 't_items{cache="lod"} 3' in lines
+    assert '# TYPE t_hits_total counter' in lines and 't_hits_total{cache="lod"} 7' in lines
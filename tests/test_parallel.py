@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+import dsp
+import parallel
+from tests.reference import make_signal
+
+
+def test_parallel():
+    arr = make_signal(10**6)
+    for workers in (1, 3):
+        assert np.array_equal(parallel.trap_filter_parallel(arr, 100, 10, workers),
+                              dsp.trap_filter(arr, 100, 10))
+        assert np.array_equal(parallel.time2spectr_parallel(arr, workers=workers),
+                              dsp.time2spectr(arr))
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+import dsp
+import payload
+from tests.reference import make_signal
+
+
+def test_round_sig():
+    ints = np.array([1, 2, 3], dtype=np.int16)
+    assert payload.round_sig(ints) is ints
+    # whole values at this magnitude become int64
+    got = payload.round_sig(np.array([1234567.4, -3.6, 0.]))
+    assert got.dtype == np.int64 and got.tolist() == [1234567, -4, 0]
+    got = payload.round_sig(np.array([12345678.4, -3.2]))
+    assert got.tolist() == [12345680, 0]
+    got = payload.round_sig(np.array([1.23456789, 0.000123456789]))
+    assert got.dtype == np.float64 and got.tolist() == [1.234568, 0.000123]
+    assert payload.round_sig(np.zeros(4)).dtype == np.int64
+
+
+def test_round_sig_non_finite():
+    # nan/inf stay floats and are kept as they are
+    got = payload.round_sig(np.array([np.nan, 12345678.4, np.inf]))
+    assert got.dtype == np.float64 and np.isnan(got[0]) and np.isinf(got[2])
+    assert got[1] == 12345680.
+    got = payload.round_sig(np.array([np.nan, 0.]))
+    assert np.isnan(got[0]) and got[1] == 0
+    assert np.isnan(payload.round_sig(np.array([np.nan, np.nan]))).all()
+
+
+def test_round_time():
+    got = payload.round_time([1/3., 2/3.], 1000)
+    assert got.tolist() == [0.333, 0.667]
+
+
+def test_spectr_trace():
+    spec = np.array([0, 0, 3, 0, 5, 0])
+    trace = payload.spectr_trace(spec, (-10, 0.5, 6))
+    assert trace['x0'] == -9 and trace['dx'] == 0.5 and trace['y'].tolist() == [3, 0, 5]
+    assert payload.trim_zeros(np.zeros(4)) == (0, 0)
+
+
+def test_time_traces():
+    y = make_signal(10**5, np.float64)
+    y[54321] = 10**5
+    small, big = y[:1000], y
+    # a window that fits keeps every sample with x implied by x0/dx
+    trace = payload.time_traces([small], 500, 1000.)[0]
+    assert set(trace) == {'x0', 'dx', 'y'} and trace['x0'] == 0.5 and trace['dx'] == 0.001
+    assert len(trace['y']) == 1000
+    # a bigger one is decimated with explicit x at the kept samples
+    trace = payload.time_traces([big], 500, 1000., points=2000)[0]
+    idx = dsp.decimate(big, 2000)
+    assert np.array_equal(trace['x'], payload.round_time((500+idx)/1000., 1000.))
+    assert len(trace['y']) <= 2000 and trace['y'].max() == 10**5
+    # decim=None is full resolution whatever the size
+    trace = payload.time_traces([big], 0, 1000., decim=None)[0]
+    assert 'x' not in trace and len(trace['y']) == len(big)
+    # a pyramid answers instead of the raw window
+    lod = dsp.LODPyramid(big)
+    trace = payload.time_traces([big], 0, 1000., lods=[lod], points=500)[0]
+    assert len(trace['y']) <= 500 and trace['y'].max() == 10**5
+
+
+def test_window_spectr():
+    arr = make_signal(100000)
+    index = dsp.SpectrIndex(arr)
+    for start, end in ((0, None), (1000, 50000)):
+        spec, layout = payload.window_spectr(arr, start, end)
+        assert layout == index.layout
+        assert np.array_equal(spec, payload.window_spectr(arr, start, end, index)[0])
+        assert np.array_equal(spec, dsp.time2spectr(arr[start:end], layout=layout))
+
+
+def test_window_traces():
+    arr = make_signal(100000)
+    ys = [arr, dsp.avg_filter(arr, 10)]
+    got = payload.window_traces(ys, 1000, 51000, 44100, points=500)
+    exp = payload.time_traces([y[1000:51000] for y in ys], 1000, 44100, points=500)
+    for g, e in zip(got, exp):
+        assert np.array_equal(g['x'], e['x']) and np.array_equal(g['y'], e['y'])
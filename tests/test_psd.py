@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from scipy.signal import welch
+
+import psd
+from tests.reference import make_signal
+
+
+def test_welch_index():
+    arr = make_signal(10**6)
+    for nperseg in (256, 1001, 4096):
+        index = psd.WelchIndex(arr, nperseg, chunk=8)
+        step = index.step
+        for start, end in ((0, len(arr)), (37*step, 500000), (3*step, 3*step+5*nperseg)):
+            freqs, density, _ = index.psd(44100, start, end)
+            exp = welch(arr[start:end].astype(np.float64), fs=44100,
+                        nperseg=nperseg, noverlap=nperseg-step)
+            assert np.allclose(freqs, exp[0]) and np.allclose(density, exp[1], rtol=1e-9), nperseg
+    assert index.psd(44100, 0, 1000)[1] is None
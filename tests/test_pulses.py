@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+import dsp
+import pulses
+from tests.reference import make_pulses, ref_pulses
+
+
+def test_pulse_detector():
+    arr = make_pulses(200000, 600)
+    L, G = 10, 20
+    trap = dsp.trap_filter(arr, L, G)[:len(arr)-L-G]
+    layout = pulses.pulse_layout(arr)
+    threshold = pulses.noise_threshold(trap)
+    for dead_time, pileup in ((0, 0), (30, 30), (100, 40), (10, 300)):
+        exp = ref_pulses(trap, threshold, dead_time, pileup)
+        for block_size in (7, 1000, 10**6):
+            det = pulses.PulseDetector(threshold, layout, dead_time, pileup)
+            for block in dsp.iter_blocks(trap, block_size):
+                det.feed(block)
+            det.finish()
+            assert np.array_equal(det.starts, [s for s, _ in exp]), (dead_time, pileup, block_size)
+            assert np.array_equal(det.heights, [h for _, h in exp]), (dead_time, pileup, block_size)
+            assert det.registered-det.piled_up == det.accepted == len(exp)
+
+
+def test_detect_pulses():
+    arr = make_pulses(200000, 600)
+    L, G = 10, 20
+    trap = dsp.trap_filter(arr, L, G)[:len(arr)-L-G]
+    threshold = pulses.noise_threshold(trap)
+    det = pulses.detect_pulses(arr, L, G, threshold=threshold, dead_time=30, pileup=30)
+    assert np.array_equal(det.starts, [s for s, _ in ref_pulses(trap, threshold, 30, 30)])
+
+
+def test_live_time():
+    arr = make_pulses(200000, 600)
+    L, G = 10, 20
+    trap = dsp.trap_filter(arr, L, G)[:len(arr)-L-G]
+    layout = pulses.pulse_layout(arr)
+    threshold = pulses.noise_threshold(trap)
+    triggers = pulses.PulseDetector(threshold, layout)
+    triggers.feed(trap)
+    triggers.finish()
+    for dead_time in (0, 30, 500):
+        # dead samples: dead_time after each registered trigger
+        dead = np.zeros(len(trap), dtype=bool)
+        last = None
+        for s in triggers.starts.tolist():
+            if last is None or s-last >= dead_time:
+                dead[s:s+dead_time] = True
+                last = s
+        det = pulses.PulseDetector(threshold, layout, dead_time)
+        for block in dsp.iter_blocks(trap, 1000):
+            det.feed(block)
+        assert det.live_time == len(trap)-dead.sum(), dead_time
+    assert pulses.PulseDetector(threshold, layout, 30).live_time == 0
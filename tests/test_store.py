@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from store import SignalStore
+
+
+def test_prune(tmp_path):
+    store = SignalStore(str(tmp_path), max_bytes=3*8200)
+    for k in range(5):
+        store.put('s{}'.format(k), np.zeros(1000), 100)
+    assert [store.exists('s{}'.format(k)) for k in range(5)] == [False, False, True, True, True]
+
+
+def test_derived(tmp_path):
+    # derived outputs are pruned against their own cap and never evict
+    # sources; removing a source removes what was derived from it
+    derived = SignalStore(str(tmp_path/'derived'), max_bytes=2*8200)
+    store = SignalStore(str(tmp_path), max_bytes=2*2200, derived=derived)
+    store.put('a', np.zeros(1000, np.int16), 100)
+    store.put('b', np.zeros(1000, np.int16), 100)
+    for k in range(4):
+        derived.put_blocks('a-avg-{}'.format(k), [np.ones(1000)], 1000, np.float64, 100,
+                           fmt='filter', source='a')
+    assert store.exists('a') and store.exists('b')
+    assert [derived.exists('a-avg-{}'.format(k)) for k in range(4)] == [False, False, True, True]
+    derived.put('b-trap-1', np.ones(1000), 100, source='b')
+    store.remove('a')
+    assert not derived.exists('a-avg-3') and derived.exists('b-trap-1')
+    store.put('c', np.zeros(1000, np.int16), 100)
+    store.put('d', np.zeros(1000, np.int16), 100)
+    assert not store.exists('b') and not derived.exists('b-trap-1')
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+
+import numpy as np
+import pytest
+
+from store import SignalStore
+from uploads import ChunkedUploads
+
+
+def test_chunked_upload(tmp_path):
+    uploads = ChunkedUploads(str(tmp_path/'uploads'))
+    store = SignalStore(str(tmp_path/'store'))
+    text = b'1\n2\n3\n4\n'
+    uploads.write('run1', io.BytesIO(text[:4]), offset=0, total=len(text))
+    with pytest.raises(ValueError):
+        uploads.write('run1', io.BytesIO(text[4:]), offset=2)
+    status = uploads.write('run1', io.BytesIO(text[4:]), offset=4)
+    assert status['received'] == len(text) and status['progress'] == 1
+    signal_id, ingest = uploads.finish('run1', store, filename='run1.txt')
+    # set aside until ingested, no longer writable
+    assert signal_id == 'run1' and not store.exists('run1')
+    assert uploads.status('run1')['received'] == 0
+    assert ingest() == 'run1'
+    assert np.array_equal(store.get('run1')[1], [1, 2, 3, 4])
+    assert store.get('run1')[2] == 'run1.txt'
+    assert not os.listdir(uploads.root)
+    uploads.write('run1', io.BytesIO(text), offset=0)
+    with pytest.raises(ValueError, match='exists'):
+        uploads.finish('run1', store)
+
+
+def test_incomplete_upload(tmp_path):
+    uploads = ChunkedUploads(str(tmp_path/'uploads'))
+    store = SignalStore(str(tmp_path/'store'))
+    uploads.write('run2', io.BytesIO(b'1\n2\n'), offset=0, total=8)
+    with pytest.raises(ValueError, match='incomplete'):
+        uploads.finish('run2', store, filename='run2.txt')
+    assert not os.listdir(uploads.root)
+    assert uploads.status('run2')['received'] == 0
+    with pytest.raises(ValueError, match='unknown'):
+        uploads.finish('run2', store)
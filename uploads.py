@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+from loaders import ingest_file
+from store import ID_RE
+
+
+COPY_BYTES = 2**20
+
+
+class ChunkedUploads(object):
+    # resumable uploads: chunks are appended to <root>/<upload_id>.part at
+    # the offset the client sends, finish() hands the file to the store
+    def __init__(self, root):
+        self.root = root
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def _path(self, upload_id, ext):
+        if not ID_RE.match(str(upload_id)):
+            raise ValueError('bad upload id: {!r}'.format(upload_id))
+        return os.path.join(self.root, '{}.{}'.format(upload_id, ext))
+
+    def status(self, upload_id):
+        path = self._path(upload_id, 'part')
+        status = {'upload_id': upload_id, 'received': 0, 'total': None}
+        if os.path.exists(path):
+            status['received'] = os.path.getsize(path)
+        meta = self._path(upload_id, 'json')
+        if os.path.exists(meta):
+            with open(meta) as f:
+                status.update(json.load(f))
+        if status['total']:
+            status['progress'] = status['received']/float(status['total'])
+        return status
+
+    def write(self, upload_id, stream, offset=0, total=None):
+        # copy stream to the part file at offset; a chunk that does not
+        # continue the file raises ValueError so the client can resume
+        path = self._path(upload_id, 'part')
+        received = os.path.getsize(path) if os.path.exists(path) else 0
+        if offset != received:
+            raise ValueError('offset {} != received {}'.format(offset, received))
+        if total is not None:
+            with open(self._path(upload_id, 'json'), 'w') as f:
+                json.dump({'total': int(total)}, f)
+        with open(path, 'ab') as f:
+            for block in iter(lambda: stream.read(COPY_BYTES), b''):
+                f.write(block)
+        return self.status(upload_id)
+
+    def finish(self, upload_id, store, filename=None, samplerate=None):
+        # (signal_id, ingest): checks the upload and sets it aside, ingest()
+        # then puts it into store under the upload id, e.g. on a background
+        # job; it reads the whole file, so it does not belong in a request.
+        # An upload short of (or past) its declared total is discarded
+        path = self._path(upload_id, 'part')
+        if not os.path.exists(path):
+            raise ValueError('unknown upload: {!r}'.format(upload_id))
+        status = self.status(upload_id)
+        if status['total'] is not None and status['received'] != status['total']:
+            self.remove(upload_id)
+            raise ValueError('incomplete upload {!r}: received {} of {} bytes'.format(
+                upload_id, status['received'], status['total']))
+        if store.exists(upload_id):
+            raise ValueError('signal {!r} exists, upload under another id'.format(upload_id))
+        ready = self._path(upload_id, 'ready')
+        os.replace(path, ready)
+
+        def ingest():
+            try:
+                return ingest_file(ready, store, name=filename or upload_id,
+                                   samplerate=samplerate, signal_id=upload_id)
+            finally:
+                self.remove(upload_id)
+        return upload_id, ingest
+
+    def remove(self, upload_id):
+        for ext in ('part', 'json', 'ready'):
+            path = self._path(upload_id, ext)
+            if os.path.exists(path):
+                os.remove(path)